@@ -0,0 +1,95 @@
+"""
+Synthetic budgets for the benchmarks: years x categories x expenses per
+category, with a number of transactions per expense and month.
+
+    python benchmarks/generate.py out_dir [--years 5] [--categories 10] [--expenses 8] [--transactions 2]
+
+The same arguments and seed always give the same budget.
+"""
+import argparse
+import calendar
+import json
+import random
+import sys
+import uuid
+from pathlib import Path
+from typing import NamedTuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from budgetApp import Budget  # noqa: E402
+from budgetMoney import Money, to_json  # noqa: E402
+
+BUDGET_FILE = 'budget.json'
+FIRST_YEAR = 2015
+MERCHANTS = ['tesco', 'lidl', 'shell', 'texaco', 'amazon', 'netflix', 'uber', 'starbucks', 'ikea', 'boots',
+             'vodafone', 'trainline', 'deliveroo', 'spotify', 'pharmacy', 'cinema', 'bakery', 'garage']
+
+
+class Scale(NamedTuple):
+    years: int = 5
+    categories: int = 10
+    expenses: int = 8
+    # Per expense and month
+    transactions: int = 2
+    seed: int = 0
+
+    def describe(self) -> str:
+        return (f'{self.years} year(s) x {self.categories} categories x {self.expenses} expenses, '
+                f'{self.transactions} transaction(s) per expense and month')
+
+
+def generate_budget(directory, scale: Scale = Scale()) -> Path:
+    """
+    Writes budget.json and its transactions into the directory, returns the budget file
+    """
+    rng = random.Random(scale.seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    budget_file = directory / BUDGET_FILE
+
+    data = {}
+    rows = []
+    for year in map(str, range(FIRST_YEAR, FIRST_YEAR + scale.years)):
+        for month in calendar.month_name[1:]:
+            month_data = data.setdefault(year, {}).setdefault(month, {})
+            for category_number in range(scale.categories):
+                category = f'Category {category_number}'
+                for expense_number in range(scale.expenses):
+                    expense = f'Expense {category_number}.{expense_number}'
+                    allotted = Money(rng.randrange(50, 500) * 100)
+                    month_data.setdefault(category, {})[expense] = {
+                        "Allotted": allotted, "Spending": Money(), "Comment": ""}
+                    # Spending hovers around the allotted amount, some expenses overspend
+                    for _ in range(scale.transactions):
+                        amount = Money(int(allotted.cents * rng.uniform(0.5, 1.3)) // max(scale.transactions, 1))
+                        comment = f'{rng.choice(MERCHANTS)} {rng.randrange(1000)}'
+                        rows.append((amount, category, expense, comment,
+                                     str(uuid.UUID(int=rng.getrandbits(128))), year, month))
+
+    with open(budget_file, 'w') as jsonfile:
+        json.dump(data, jsonfile, default=to_json)
+
+    budget = Budget(str(budget_file))
+    budget.add_transactions(rows)
+    # Fold the spending records into the budget file, the benchmarks start from a compacted budget
+    budget.storage.journal.compact(wait=True)
+    return budget_file
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    for name, default in Scale._field_defaults.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    args = parser.parse_args()
+
+    scale = Scale(*(getattr(args, name) for name in Scale._fields))
+    budget_file = generate_budget(args.directory, scale)
+    print(f'{budget_file}: {scale.describe()}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
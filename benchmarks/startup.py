@@ -0,0 +1,98 @@
+"""
+Startup benchmark: which modules the app pulls in before the first window
+shows up and how long that takes.
+
+    python benchmarks/startup.py [--budget data.json] [--top 15]
+
+Exits with an error when one of the plotting/analysis packages is
+imported at startup again, they are meant to load on the first chart,
+or when the model or the command line import a GUI toolkit.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+STARTUP_MODULES = ('budgetApp', 'budgetUI', 'budgetCli')
+# Must not be imported before the user asks for a chart
+DEFERRED_PACKAGES = ('pandas', 'seaborn', 'matplotlib')
+# The model and the command line run without any GUI toolkit
+HEADLESS_MODULES = ('budgetApp', 'budgetCli')
+GUI_PACKAGES = ('PySide2', 'tkinter')
+
+FIRST_WINDOW = """
+import sys
+from PySide2 import QtWidgets
+app = QtWidgets.QApplication(sys.argv)
+import budgetApp
+budget = budgetApp.Budget(sys.argv[1])
+editor = budgetApp.open_editor(budget)
+app.processEvents()
+"""
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Runs `python -X importtime -c "import <module>"` and returns
+    {module name: (self us, cumulative us)}
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def first_window_time(budget_file: str) -> float:
+    """
+    Seconds from launching the interpreter until the editor window is shown
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', FIRST_WINDOW, budget_file], cwd=ROOT, env=env,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', help='budget file to open, a small generated one by default')
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports to list')
+    args = parser.parse_args()
+
+    failed = False
+    for module in STARTUP_MODULES:
+        times = import_times(module)
+        total = times[module][1] if module in times else 0
+        print(f'import {module}: {total / 1000:.1f} ms cumulative')
+        for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][1])[:args.top]:
+            print(f'    {cumulative_us / 1000:9.1f} ms  {name}')
+        loaded = sorted({name.split('.')[0] for name in times} & set(DEFERRED_PACKAGES))
+        if module in HEADLESS_MODULES:
+            loaded += sorted({name.split('.')[0] for name in times} & set(GUI_PACKAGES))
+        if loaded:
+            print(f'FAIL: import {module} loads {", ".join(loaded)}')
+            failed = True
+
+    budget_file = args.budget
+    if budget_file is None:
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as jsonfile:
+            json.dump({"2023": {"January": {"Food": {"Groceries": {
+                "Allotted": 300, "Spending": 120, "Comment": ""}}}}}, jsonfile)
+            budget_file = jsonfile.name
+    print(f'time to first window: {first_window_time(budget_file) * 1000:.0f} ms')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+Latency and peak memory of the hot paths of the budget on a synthetic
+budget, compared against a saved baseline.
+
+    python benchmarks/suite.py [--years 5] [--categories 10] [--expenses 8] [--transactions 2]
+    python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --cases load save --output results.json
+
+Every case runs in its own interpreter on a fresh copy of the generated
+budget, the window cases on the Qt offscreen platform. The median of the
+repeats and the tracemalloc peak of one more run are recorded. Exits
+with an error when a case is slower or uses more memory than the
+baseline allows, see --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+from generate import ROOT, Scale, generate_budget
+from budgetMoney import Money
+
+BASELINE_FILE = Path(__file__).resolve().parent / 'baseline.json'
+# Differences below these are noise whatever the tolerance
+MIN_REGRESSION_MS = 2.0
+MIN_REGRESSION_KB = 256
+
+
+class Case(NamedTuple):
+    # setup(budget_file) returns the state handed to run, only run is measured
+    setup: Callable
+    run: Callable
+    gui: bool = False
+
+
+def fresh_copy(budget_file: Path) -> str:
+    directory = Path(tempfile.mkdtemp(prefix='budget-bench-'))
+    for path in budget_file.parent.iterdir():
+        shutil.copy(path, directory)
+    return str(directory / budget_file.name)
+
+
+def open_budget(budget_file: Path):
+    from budgetApp import Budget
+
+    return Budget(fresh_copy(budget_file))
+
+
+def last_month(budget):
+    year = list(budget.data)[-1]
+    return year, list(budget.data[year])[-1]
+
+
+def open_window(budget_file: Path, show_month: bool = True):
+    from PySide2 import QtWidgets
+
+    import budgetApp
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    budget = budgetApp.Budget(fresh_copy(budget_file))
+    editor = budgetApp.open_editor(budget)
+    if show_month:
+        editor.get_data_for_date(*last_month(budget))
+        editor.tree.expandAll()
+    app.processEvents()
+    return app, editor
+
+
+def settle(app, editor) -> None:
+    """
+    Waits for the queued jobs and delivers their results to the window
+    """
+    editor.jobs.wait()
+    app.processEvents()
+
+
+def load_all(budget_file: str):
+    from budgetApp import Budget
+
+    budget = Budget(budget_file)
+    for year, year_data in budget.data.items():
+        for month in year_data:
+            year_data[month]
+    return budget
+
+
+def edit_every_month(budget):
+    for year, year_data in budget.data.items():
+        for month, month_data in year_data.items():
+            category, category_data = next(iter(month_data.items()))
+            expense, expense_data = next(iter(category_data.items()))
+            budget.update_expense(year, month, category, expense, expense_data["Allotted"] + Money(100),
+                                  expense_data["Spending"], 'edited')
+    return budget
+
+
+def rollup_all(budget):
+    for year, year_data in budget.data.items():
+        for month in year_data:
+            budget.update_spending_from_transactions(year, month)
+
+
+def show_month(state):
+    app, editor = state
+    editor.get_data_for_date(*last_month(editor.budget))
+    editor.tree.expandAll()
+    app.processEvents()
+
+
+def edit_shown_month(budget_file: Path):
+    app, editor = open_window(budget_file)
+    model = editor.tree.model()
+    for category, expense, expense_data in list(model.expenses()):
+        model.set_value(category, expense, "Allotted", expense_data["Allotted"] + Money(100))
+    return app, editor
+
+
+def save_tree(state):
+    app, editor = state
+    editor.save_tree_data()
+    settle(app, editor)
+
+
+def visualize(state):
+    app, editor = state
+    editor.visualize_data()
+    settle(app, editor)
+
+
+def trend(state):
+    app, editor = state
+    editor.visualize_trend()
+    settle(app, editor)
+
+
+CASES: Dict[str, Case] = {
+    # Opening the budget (storage load and journal replay), all months included
+    'load': Case(fresh_copy, load_all),
+    'save': Case(lambda budget_file: edit_every_month(open_budget(budget_file)), lambda budget: budget.save()),
+    # Spending of every month from the transactions (update_budget_with_transactions)
+    'rollup': Case(open_budget, rollup_all),
+    'reports': Case(open_budget, lambda budget: (budget.reports.monthly(), budget.reports.overspend_streaks())),
+    'show_month': Case(lambda budget_file: open_window(budget_file, show_month=False), show_month, gui=True),
+    'save_tree_data': Case(edit_shown_month, save_tree, gui=True),
+    'visualize_data': Case(open_window, visualize, gui=True),
+    'trend': Case(open_window, trend, gui=True),
+}
+
+
+def run_case(name: str, budget_file: Path, repeat: int) -> dict:
+    """
+    Runs the case in this interpreter, called in the child process
+    """
+    case = CASES[name]
+    if case.gui:
+        try:
+            import PySide2  # noqa: F401
+        except ImportError as error:
+            return {'skipped': str(error)}
+    timings = []
+    for _ in range(repeat):
+        state = case.setup(budget_file)
+        start = time.perf_counter()
+        case.run(state)
+        timings.append((time.perf_counter() - start) * 1000)
+    # Memory is measured on its own run, tracemalloc slows everything down
+    state = case.setup(budget_file)
+    tracemalloc.start()
+    case.run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'median_ms': round(statistics.median(timings), 2), 'min_ms': round(min(timings), 2),
+            'peak_kb': round(peak / 1024)}
+
+
+def measure(name: str, budget_file: Path, repeat: int) -> dict:
+    # The copies made by the case land next to the generated budget and go away with it
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'),
+               TMPDIR=str(budget_file.parent.parent))
+    result = subprocess.run([sys.executable, __file__, '--run-case', name, '--budget', str(budget_file),
+                             '--repeat', str(repeat)], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'failed': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'no output'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float,
+                memory_tolerance: float) -> Dict[str, List[str]]:
+    found = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or 'median_ms' not in base or 'median_ms' not in result:
+            continue
+        slower = result['median_ms'] - base['median_ms']
+        if slower > MIN_REGRESSION_MS and result['median_ms'] > base['median_ms'] * (1 + tolerance):
+            found.setdefault(name, []).append(f'{result["median_ms"]:.1f} ms, baseline {base["median_ms"]:.1f} ms')
+        bigger = result['peak_kb'] - base['peak_kb']
+        if bigger > MIN_REGRESSION_KB and result['peak_kb'] > base['peak_kb'] * (1 + memory_tolerance):
+            found.setdefault(name, []).append(f'peak {result["peak_kb"]} KB, baseline {base["peak_kb"]} KB')
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in Scale._field_defaults.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='record the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--memory-tolerance', type=float, default=0.10, help='allowed relative peak memory growth')
+    parser.add_argument('-o', '--output', type=Path, help='also write the results to this JSON file')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--budget', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.budget, args.repeat)))
+        return 0
+
+    scale = Scale(*(getattr(args, name) for name in Scale._fields))
+    directory = Path(tempfile.mkdtemp(prefix='budget-bench-'))
+    try:
+        print(f'generating {scale.describe()}')
+        budget_file = generate_budget(directory / 'generated', scale)
+        results = {}
+        for name in args.cases:
+            results[name] = measure(name, budget_file, args.repeat)
+            result = results[name]
+            if 'median_ms' in result:
+                print(f'{name:<16} {result["median_ms"]:10.1f} ms  (min {result["min_ms"]:.1f})'
+                      f'  {result["peak_kb"]:8} KB peak')
+            else:
+                print(f'{name:<16} {"skipped" if "skipped" in result else "FAILED"}: '
+                      f'{result.get("skipped") or result.get("failed")}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {'scale': scale._asdict(), 'python': platform.python_version(), 'machine': platform.machine(),
+              'cases': results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=4))
+    failed = any('failed' in result for result in results.values())
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=4))
+        print(f'baseline written to {args.baseline}')
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if baseline['scale'] != scale._asdict():
+            print(f'FAIL: {args.baseline} was recorded at another scale: {Scale(**baseline["scale"]).describe()}')
+            return 1
+        for name, regression in regressions(results, baseline['cases'], args.tolerance,
+                                             args.memory_tolerance).items():
+            print(f'FAIL: {name} regressed, {"; ".join(regression)}')
+            failed = True
+    else:
+        print(f'no baseline at {args.baseline}, record one with --save-baseline')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
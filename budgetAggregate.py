@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from budgetMoney import CENTS, Money
+
+COLUMNS = ['year', 'month', 'category', 'expense', 'allotted', 'spending']
+
+
+class BudgetAggregates:
+    """
+    Columnar view of the expenses of the budget.
+
+    Every month is converted once into a frame with allotted/spending
+    columns in integer cents and kept until the budget bumps the version of
+    that month, the totals are then answered with grouped vectorized integer
+    sums instead of walking the month dicts, and only converted to units
+    when they are returned.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._months: Dict[Tuple[str, str], Tuple[int, pd.DataFrame]] = {}
+
+    def month_frame(self, year: str, month: str) -> pd.DataFrame:
+        version = self.budget.month_version(year, month)
+        cached = self._months.get((year, month))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        month_data = self.budget.data.get(year, {}).get(month) or {}
+        rows = [(category, expense, expense_data["Allotted"], expense_data["Spending"])
+                for category, category_data in month_data.items()
+                for expense, expense_data in category_data.items()]
+        categories, expenses, allotted, spending = zip(*rows) if rows else ((), (), (), ())
+        frame = pd.DataFrame({
+            'year': year,
+            'month': month,
+            'category': pd.Series(categories, dtype=object),
+            'expense': pd.Series(expenses, dtype=object),
+            'allotted': np.fromiter((Money.parse(value).cents for value in allotted), np.int64, len(allotted)),
+            'spending': np.fromiter((Money.parse(value).cents for value in spending), np.int64, len(spending)),
+        }, columns=COLUMNS)
+        self._months[(year, month)] = (version, frame)
+        return frame
+
+    def frame(self, months: Iterable[Tuple[str, str]] = None) -> pd.DataFrame:
+        """
+        Expenses of the given (year, month) pairs, every month of the budget by default
+        """
+        if months is None:
+            months = [(year, month) for year, year_data in self.budget.data.items() for month in year_data]
+        frames = [self.month_frame(year, month) for year, month in months]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def by_category(self, year: str, month: str) -> pd.DataFrame:
+        """
+        Allotted and spending per category of the month, in the budget order
+        """
+        return self.month_frame(year, month).groupby('category', sort=False)[['allotted', 'spending']].sum() / CENTS
+
+    def by_month(self, year: str = None) -> pd.DataFrame:
+        months = None
+        if year is not None:
+            months = [(year, month) for month in self.budget.data.get(year, {})]
+        frame = self.frame(months)
+        return frame.groupby(['year', 'month'], sort=False)[['allotted', 'spending']].sum() / CENTS
+
+    def overall(self, year: str = None, month: str = None) -> Tuple[float, float]:
+        if month is not None:
+            frame = self.month_frame(year, month)
+        elif year is not None:
+            frame = self.frame([(year, data_month) for data_month in self.budget.data.get(year, {})])
+        else:
+            frame = self.frame()
+        return int(frame['allotted'].sum()) / CENTS, int(frame['spending'].sum()) / CENTS
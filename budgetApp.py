@@ -1,48 +1,56 @@
+import calendar
 import configparser
-import json
 import logging
 import sys
-import tkinter
 import uuid
 from dataclasses import dataclass, field
 from pathlib import Path
-from tkinter import filedialog
-from typing import Dict, List, Set
+from typing import Dict, Iterable, List, Sequence, Tuple
 
-from PySide2 import QtWidgets
+from budgetLedger import TransactionLedger, TransactionRow
+from budgetMoney import Money
+from budgetStorage import open_storage
+from budgetTrace import span
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Month names as the UI writes them in the budget
+MONTHS = list(calendar.month_name)[1:]
+
 
 @dataclass(frozen=True)
 class Transaction:
-    amount: float
+    amount: Money
     category: str
     expense: str
     comment: str
     id: str
+    year: str = ''
+    month: str = ''
 
 
 class Budget:
     """
     The class is managing the database:
     adding the data if the new expense/category added to the UI
-    saves the update to the database
+    saves the update to the database.
+    It doesn't depend on the UI, open_editor shows a window for it.
     """
 
     def __init__(self, file_path: str):
         self.file_path = file_path
-        self._data = set_json_data(file_path)
-        self.budget_transactions = BudgetTransactions()
-
-        from budgetUI import BudgetEditorWindow
-
-        budget_editor = BudgetEditorWindow(self)
-        budget_editor.show()
-        budget_editor.add_new_transaction_signal.connect(self.add_new_transaction)
-        budget_editor.del_transaction_signal.connect(self.del_transaction)
-        budget_editor.del_row_signal.connect(self.delete_category)
+        self.storage = open_storage(file_path)
+        with span('load', file=str(file_path)):
+            self._data = self.storage.load()
+            self.budget_transactions = BudgetTransactions(
+                TransactionLedger.from_rows(self.storage.load_transactions()))
+        # Bumped on every change of a month, lets the derived views
+        # (aggregates, reports, charts) know when their cached copy is stale
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._aggregates = None
+        self._reports = None
+        self._categorizer = None
 
     @property
     def data(self):
@@ -56,13 +64,52 @@ class Budget:
     def transactions(self):
         return self.budget_transactions.transactions
 
-    def add_new_category(self, year: str, month: str, category: str, expense: str, allotted: str, comment: str) -> None:
+    @property
+    def aggregates(self):
+        if self._aggregates is None:
+            from budgetAggregate import BudgetAggregates
+
+            self._aggregates = BudgetAggregates(self)
+        return self._aggregates
+
+    @property
+    def reports(self):
+        if self._reports is None:
+            from budgetReports import BudgetReports
+
+            self._reports = BudgetReports(self)
+        return self._reports
+
+    @property
+    def categorizer(self):
+        """
+        Suggests expenses from the import rules and the comments of the
+        transactions, learned on first use and kept up to date afterwards
+        """
+        if self._categorizer is None:
+            from budgetCategorize import Categorizer
+            from budgetImport import ImportRules, RULES_FILE
+
+            rules = ImportRules.from_file(Path(self.file_path).with_name(RULES_FILE))
+            self._categorizer = Categorizer(rules).learn(self.transactions)
+        return self._categorizer
+
+    def month_version(self, year: str, month: str) -> int:
+        return self._versions.get((year, month), 0)
+
+    def touch(self, year: str, month: str) -> None:
+        """
+        Marks the month as changed, called for every mutation of its data
+        """
+        self._versions[(year, month)] = self._versions.get((year, month), 0) + 1
+
+    def add_new_category(self, year: str, month: str, category: str, expense: str, allotted, comment: str) -> None:
         """
         Updates the database when the new expense is added to the UI
         """
         month_data = self.data[year][month]
-        expense_data = {expense: {"Allotted": allotted,
-                                  "Spending": 0,
+        expense_data = {expense: {"Allotted": Money.parse(allotted),
+                                  "Spending": Money(),
                                   "Comment": comment}}
         if category in month_data:
             month_data[category].update(expense_data)
@@ -70,52 +117,290 @@ class Budget:
 
             month_data[category] = expense_data
         self.data[year][month] = month_data
+        self.touch(year, month)
+        self.storage.set_expense(year, month, category, expense, expense_data[expense])
+
+    def roll_forward(self, source: Tuple[str, str], targets: Iterable[Tuple[str, str]],
+                     keep_spending: bool = False, overwrite: bool = False) -> int:
+        """
+        Copies the categories and expenses of the source month into every
+        target month, with their allotted amount and comment and no spending
+        unless keep_spending. Expenses a target already has are kept unless
+        overwrite. The source month is not modified, the targets get their
+        own expense dicts and each of them is stored as a single record.
+        Returns the number of expenses copied.
+        """
+        source_year, source_month = source
+        source_data = self.data[source_year][source_month]
+        copied = 0
+        for year, month in targets:
+            if (year, month) == (source_year, source_month):
+                continue
+            existing = self.data.get(year, {}).get(month, {})
+            added = {}
+            for category, category_data in source_data.items():
+                for expense, expense_data in category_data.items():
+                    if expense in existing.get(category, {}) and not overwrite:
+                        continue
+                    added.setdefault(category, {})[expense] = {
+                        "Allotted": expense_data["Allotted"],
+                        "Spending": expense_data["Spending"] if keep_spending else Money(),
+                        "Comment": expense_data["Comment"]}
+            if not added:
+                continue
+            month_data = self.data.setdefault(year, {}).setdefault(month, {})
+            for category, expenses in added.items():
+                month_data.setdefault(category, {}).update(expenses)
+            self.touch(year, month)
+            self.storage.merge_month(year, month, added)
+            copied += sum(map(len, added.values()))
+        logger.info(f'rolled {source_month} {source_year} forward, {copied} expense(s) copied')
+        return copied
+
+    def add_new_month(self, year: str, month: str) -> dict:
+        """
+        Makes sure the month exists in the database and returns its data
+        """
+        if month not in self.data.setdefault(year, {}):
+            self.data[year][month] = {}
+            self.touch(year, month)
+            self.storage.add_month(year, month)
+        return self.data[year][month]
+
+    def update_expense(self, year: str, month: str, category: str, expense: str,
+                       allotted, spending, comment: str) -> None:
+        """
+        Overwrites the expense with the values edited in the UI, the
+        expense dict is updated in place as the UI model references it
+        """
+        expense_data = self.add_new_month(year, month).setdefault(category, {}).setdefault(expense, {})
+        expense_data.update({"Allotted": Money.parse(allotted),
+                             "Spending": Money.parse(spending),
+                             "Comment": comment})
+        self.touch(year, month)
+        self.storage.set_expense(year, month, category, expense, expense_data)
+
+    def apply_changes(self, changes: Dict[Tuple[str, str, str, str], dict]) -> None:
+        """
+        Hands the expenses edited in place by the UI, keyed by
+        (year, month, category, expense), over to the storage
+        """
+        for (year, month, category, expense), expense_data in changes.items():
+            self.update_expense(year, month, category, expense,
+                                expense_data["Allotted"],
+                                expense_data["Spending"],
+                                expense_data["Comment"])
+
+    def set_spending(self, year: str, month: str, category: str, expense: str, spending: Money) -> None:
+        expense_data = self.data[year][month][category][expense]
+        expense_data["Spending"] = Money.parse(spending)
+        self.touch(year, month)
+        self.storage.set_expense(year, month, category, expense, expense_data)
+
+    def update_spending_from_transactions(self, year: str, month: str) -> Dict[str, Dict[str, Money]]:
+        """
+        Sets the spending of every expense that has transactions in the month
+        to their total, returns the totals applied
+        """
+        with span('rollup', year=year, month=month):
+            month_data = self.data.get(year, {}).get(month, {})
+            spending = self.budget_transactions.rollup(year, month)
+            for category, category_spending in spending.items():
+                for expense, total in list(category_spending.items()):
+                    if expense not in month_data.get(category, {}):
+                        logger.warning(f'no expense {category}/{expense} in {month} {year} for its transactions')
+                        del category_spending[expense]
+                        continue
+                    self.set_spending(year, month, category, expense, total)
+        return spending
 
     def delete_category(self, *args):
         year = args[0]
         month = args[1]
         category = args[2]
         expense = args[3]
-        data_expense = self.data.get(year).get(month).get(category).get(expense)
+        category_data = self.data.get(year, {}).get(month, {}).get(category)
+        if category_data is None:
+            # Rows transferred from another month don't exist in this one yet.
+            return
+        self.touch(year, month)
+        data_expense = category_data.get(expense)
         if data_expense:
-            print("deleting expense")
             del self.data[year][month][category][expense]
+            self.storage.delete(year, month, category, expense)
         else:
             del self.data[year][month][category]
+            self.storage.delete(year, month, category)
 
     def add_new_transaction(self, *args, **kwargs) -> None:
-        self.budget_transactions.add_new_transaction(*args)
+        transaction = self.budget_transactions.add_new_transaction(*args)
+        if self._categorizer is not None:
+            self._categorizer.observe(transaction)
+        # Recorded before the transaction is queued, the group commit of
+        # the transaction then carries the spending with it
+        self._sync_spending(transaction.year, transaction.month, transaction.category, transaction.expense)
+        self.storage.add_transaction(transaction)
+
+    def add_transactions(self, rows: Iterable[Sequence]) -> None:
+        """
+        Adds a batch of transactions given as ledger rows (amount, category,
+        expense, comment, id, year, month) and commits it with their spending
+        """
+        transactions = self.budget_transactions.add_transactions(rows)
+        if self._categorizer is not None:
+            self._categorizer.learn(transactions)
+        for key in dict.fromkeys((transaction.year, transaction.month, transaction.category, transaction.expense)
+                                 for transaction in transactions):
+            self._sync_spending(*key)
+        self.storage.add_transactions(transactions)
 
     def del_transaction(self, transaction: Dict[str, str]) -> None:
         if transaction is None:
             return
-        self.budget_transactions.del_transaction(Transaction(**transaction))
+        stored = self._remove_transaction(Transaction(**transaction))
+        if stored is None:
+            return
+        self._sync_spending(stored.year, stored.month, stored.category, stored.expense)
+        self.storage.delete_transaction(stored)
+
+    def _remove_transaction(self, transaction):
+        """
+        Takes the transaction out of the ledger in memory, the caller deletes
+        it from the storage once the spending is synced
+        """
+        stored = self.transactions.get(transaction.id)
+        if stored is None:
+            return None
+        if self._categorizer is not None:
+            self._categorizer.forget(stored)
+        self.budget_transactions.del_transaction(stored)
+        return stored
+
+    def recategorize(self, category: str, expense: str) -> int:
+        """
+        Moves the transactions of the expense (e.g. the uncategorized
+        imports) to the expense the categorizer suggests for their
+        comment, returns how many were moved
+        """
+        categorizer = self.categorizer
+        rows = []
+        for transaction in self.transactions.for_expense(category, expense):
+            target = categorizer.match(transaction.comment)
+            if target is not None and target != (category, expense):
+                rows.append((transaction.amount, *target, transaction.comment,
+                             transaction.id, transaction.year, transaction.month))
+        if not rows:
+            return 0
+        months = dict.fromkeys((row[5], row[6]) for row in rows)
+        for row in rows:
+            self._remove_transaction(self.transactions.get(row[4]))
+        for year, month in months:
+            self._sync_spending(year, month, category, expense)
+        # Stored again under the same ids, which replaces them in the storage
+        self.add_transactions(rows)
+        return len(rows)
+
+    def spending_total(self, year: str, month: str, category: str, expense: str) -> Money:
+        """
+        Sum of the transactions of the expense, kept up to date as transactions come and go
+        """
+        return self.budget_transactions.total(year, month, category, expense)
+
+    def _sync_spending(self, year: str, month: str, category: str, expense: str) -> None:
+        """
+        Sets the spending of the expense to its transactions total, the
+        storage commits it together with the next transaction commit
+        """
+        expense_data = self.data.get(year, {}).get(month, {}).get(category, {}).get(expense)
+        if expense_data is None:
+            return
+        expense_data["Spending"] = self.spending_total(year, month, category, expense)
+        self.touch(year, month)
+        self.storage.set_spending(year, month, category, expense, expense_data["Spending"])
+
+    def totals(self, year: str = None, month: str = None) -> Dict[str, Tuple[Money, Money]]:
+        """
+        Allotted and spending per category, over a month, a year or the whole budget
+        """
+        return self.storage.totals(year, month)
 
     def save(self):
-        with open(self.file_path, 'w') as jsonfile:
-            json.dump(self.data, jsonfile, indent=4)
+        """
+        Persists the changes made since the last save, for the JSON file it
+        appends them to the journal, the main file is only rewritten by
+        the background compaction
+        """
+        with span('save'):
+            self.storage.save()
 
 
 @dataclass
 class BudgetTransactions:
-    transactions: Set[Transaction] = field(default_factory=set)
+    transactions: TransactionLedger = field(default_factory=TransactionLedger)
+
+    def total(self, year: str, month: str, category: str, expense: str) -> Money:
+        return self.transactions.total(year, month, category, expense)
 
-    def add_new_transaction(self, category: str, expense: str, amount: float, comment: str) -> None:
+    def add_new_transaction(self, category: str, expense: str, amount, comment: str,
+                            year: str = '', month: str = '') -> TransactionRow:
         transaction_id = str(uuid.uuid4())
-        self.transactions.add(Transaction(amount, category, expense, comment, transaction_id))
+        transaction = self.transactions.add_row(amount, category, expense, comment, transaction_id, year, month)
         logger.info(f'transaction {transaction_id} added')
+        return transaction
+
+    def add_transactions(self, rows: Iterable[Sequence]) -> List[TransactionRow]:
+        transactions = [self.transactions.add_row(*row) for row in rows]
+        logger.info(f'{len(transactions)} transaction(s) added')
+        return transactions
 
     def del_transaction(self, transaction: Transaction) -> None:
         logger.info(f'deleting transaction {transaction}')
         self.transactions.discard(transaction)
 
+    def rollup(self, year: str, month: str) -> Dict[str, Dict[str, Money]]:
+        """
+        Spending totals of the month per category and expense, read from the
+        running sums kept by the ledger
+        """
+        spending = {}
+        for (category, expense), total in self.transactions.month_totals(year, month).items():
+            spending.setdefault(category, {})[expense] = total
+        return spending
+
+
+def following_months(year: str, month: str, count: int) -> List[Tuple[str, str]]:
+    """
+    The count months after the given one, crossing into the next years
+
+    :Example:
+
+    following_months("2023", "November", 3)
+    ...[('2023', 'December'), ('2024', 'January'), ('2024', 'February')]
+    """
+    index = MONTHS.index(month)
+    return [(str(int(year) + (index + step) // 12), MONTHS[(index + step) % 12]) for step in range(1, count + 1)]
 
-def set_json_data(data_path):
-    with open(data_path, 'r') as jsonfile:
-        return json.load(jsonfile)
+
+def open_editor(budget: Budget):
+    """
+    Shows the editor window of the budget, a QApplication has to exist
+    """
+    from budgetUI import BudgetEditorWindow
+
+    budget_editor = BudgetEditorWindow(budget)
+    budget_editor.show()
+    budget_editor.add_new_transaction_signal.connect(budget.add_new_transaction)
+    budget_editor.del_transaction_signal.connect(budget.del_transaction)
+    budget_editor.del_row_signal.connect(budget.delete_category)
+    return budget_editor
 
 
 if __name__ == '__main__':
+    import tkinter
+    from tkinter import filedialog
+
+    from PySide2 import QtWidgets
+
     config_file = Path(__file__).parent / r"config.ini"
     config = configparser.ConfigParser()
     if not config_file.exists():
@@ -133,11 +418,12 @@ if __name__ == '__main__':
     app = QtWidgets.QApplication(sys.argv)
     file_path = filedialog.askopenfilename(
         parent=root, title='Select data JSON file', initialfile=last_file,
-        initialdir=last_file.parent, filetypes=[('JSON', '*.json')])
+        initialdir=last_file.parent, filetypes=[('JSON', '*.json *.json.gz'), ('SQLite', '*.db *.sqlite *.sqlite3')])
     last_file = Path(file_path)
     config.set('settings', 'last_file', last_file.as_posix())
     with open(config_file, 'w') as configfile:
         config.write(configfile)
 
     bud = Budget(file_path)
+    editor = open_editor(bud)
     sys.exit(app.exec_())
@@ -0,0 +1,120 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from budgetImport import DEFAULT_EXPENSE, ImportRules
+
+# Learned keywords are whole words of at least three letters
+_WORD = re.compile(r'[^\W\d_]{3,}')
+# A keyword becomes a rule once it was seen this many times...
+MIN_SUPPORT = 2
+# ...with the same expense at least this often
+MIN_CONFIDENCE = 0.75
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex alternation of the words factored as a trie, the regex engine
+    then walks the shared prefixes once instead of trying every word
+
+    :Example:
+
+    trie_pattern(['tesco', 'texaco', 'lidl'])
+    ...'(?:lidl|te(?:sco|xaco))'
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = None
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    branches = [re.escape(char) + _node_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+    if '' in node:
+        # A word ends here and longer ones go on
+        pattern = f'(?:{pattern})?'
+    return pattern
+
+
+class Categorizer:
+    """
+    Suggests the (category, expense) of a transaction from its comment.
+
+    The explicit import rules are tried first. Otherwise the suggestion
+    comes from keywords learned from the comments of the transactions
+    already in the budget: a word that mostly went to one expense maps
+    to it. The keywords are compiled into a single trie shaped regex,
+    and the most reliable keyword found in the comment wins.
+    """
+
+    def __init__(self, rules: ImportRules = None, min_support: int = MIN_SUPPORT,
+                 min_confidence: float = MIN_CONFIDENCE, ignored: Iterable[Tuple[str, str]] = (DEFAULT_EXPENSE,)):
+        self.rules = rules or ImportRules()
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        # Where the uncategorized transactions are, they teach nothing
+        self.ignored = set(ignored)
+        self._counts: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self._keywords: Dict[str, Tuple[Tuple[str, str], float, int]] = {}
+        self._pattern: Optional["re.Pattern"] = None
+        self._stale = False
+
+    def learn(self, transactions: Iterable) -> "Categorizer":
+        for transaction in transactions:
+            self.observe(transaction)
+        return self
+
+    def observe(self, transaction, weight: int = 1) -> None:
+        target = (transaction.category, transaction.expense)
+        if target in self.ignored:
+            return
+        for word in set(_WORD.findall(transaction.comment.lower())):
+            targets = self._counts.setdefault(word, {})
+            targets[target] = targets.get(target, 0) + weight
+        self._stale = True
+
+    def forget(self, transaction) -> None:
+        self.observe(transaction, -1)
+
+    def _compile(self) -> None:
+        keywords = {}
+        for word, targets in self._counts.items():
+            target, count = max(targets.items(), key=lambda item: item[1])
+            total = sum(targets.values())
+            if count >= self.min_support and count >= total * self.min_confidence:
+                keywords[word] = (target, count / total, count)
+        self._keywords = keywords
+        self._pattern = None
+        if keywords:
+            self._pattern = re.compile(rf'(?<![^\W\d_])(?:{trie_pattern(keywords)})(?![^\W\d_])', re.IGNORECASE)
+        self._stale = False
+
+    def match(self, text: str) -> Optional[Tuple[str, str]]:
+        """
+        (category, expense) suggested for the text, None when nothing is known about it
+        """
+        target = self.rules.match(text)
+        if target is not None:
+            return target
+        if self._stale:
+            self._compile()
+        if self._pattern is None:
+            return None
+        found = self._pattern.findall(text)
+        if not found:
+            return None
+        best = max(found, key=lambda word: self._keywords[word.lower()][1:])
+        return self._keywords[best.lower()][0]
+
+    def categorize(self, texts: Iterable[str]) -> List[Optional[Tuple[str, str]]]:
+        return [self.match(text) for text in texts]
+
+    def keywords(self) -> Dict[str, Tuple[str, str]]:
+        if self._stale:
+            self._compile()
+        return {word: keyword[0] for word, keyword in self._keywords.items()}
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import pandas as pd
+import seaborn as sns
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+
+from budgetTrace import count, span
+
+# Number of rendered month charts kept around for calendar navigation
+CACHE_SIZE = 12
+TYPES = ['Allotted', 'Spending']
+
+
+class ChartEntry:
+    """
+    Rendered chart of one month together with the artists that can be
+    updated in place when only the amounts change
+    """
+    __slots__ = ('figure', 'axes', 'categories', 'version', 'bars', 'labels', 'background')
+
+    def __init__(self, figure: Figure, categories: List[str], version: int):
+        self.figure = figure
+        self.axes = figure.axes[0]
+        self.categories = categories
+        self.version = version
+        self.bars = []
+        self.labels = []
+        self.background = None
+
+    def animated(self):
+        for bars in self.bars:
+            yield from bars
+        for labels in self.labels:
+            yield from labels
+
+
+class BudgetChart:
+    """
+    Allotted vs spending bar chart of a month.
+
+    Rendered figures are cached by (year, month) together with the data
+    version they show: showing a month again only swaps the figure on the
+    canvas, and when only the amounts changed the bars and their labels
+    are updated in place and blitted instead of rebuilding the plot.
+    """
+
+    def __init__(self):
+        sns.set_theme(style="whitegrid", palette="pastel", font_scale=1.2, color_codes=True)
+        self.canvas = FigureCanvasQTAgg(self._new_figure())
+        self._entries: "OrderedDict[Tuple[str, str], ChartEntry]" = OrderedDict()
+        self._current: Optional[ChartEntry] = None
+
+    @staticmethod
+    def _new_figure() -> Figure:
+        figure = Figure()
+        figure.add_subplot()
+        figure.set_facecolor("#AAAAAA")
+        return figure
+
+    def show(self, year: str, month: str, version: int, totals: pd.DataFrame) -> None:
+        """
+        totals: allotted/spending columns indexed by category, Overall row included
+        """
+        with span('chart render', year=year, month=month):
+            self._show(year, month, version, totals)
+
+    def _show(self, year: str, month: str, version: int, totals: pd.DataFrame) -> None:
+        entry = self._entries.get((year, month))
+        categories = list(totals.index)
+        if entry is None or entry.categories != categories:
+            count('chart builds')
+            entry = self._build(month, categories, version, totals)
+            self._entries[(year, month)] = entry
+            while len(self._entries) > CACHE_SIZE:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end((year, month))
+
+        if entry is not self._current:
+            self._attach(entry)
+            if entry.version != version:
+                self._update(entry, version, totals)
+            self.canvas.draw()
+        elif entry.version != version:
+            if self._update(entry, version, totals) or entry.background is None:
+                self.canvas.draw()
+            else:
+                self._blit(entry)
+
+    def show_trend(self, monthly: pd.DataFrame) -> None:
+        """
+        monthly: allotted/spending columns indexed by (year, month), as the reports give them
+        """
+        with span('chart render', months=len(monthly)):
+            self._show_trend(monthly)
+
+    def _show_trend(self, monthly: pd.DataFrame) -> None:
+        figure = self._new_figure()
+        axes = figure.axes[0]
+        positions = range(len(monthly))
+        for column, label in zip(['allotted', 'spending'], TYPES):
+            # Plain lines, seaborn would aggregate the points it is given
+            axes.plot(positions, monthly[column].to_numpy(), label=label)
+        years = monthly.index.get_level_values('year')
+        ticks = [position for position in positions if position == 0 or years[position] != years[position - 1]]
+        axes.set_xticks(ticks)
+        axes.set_xticklabels([years[position] for position in ticks])
+        axes.set_title('Budget Trend')
+        axes.set_ylabel('Amount')
+        axes.legend()
+        sns.despine(ax=axes, offset=10)
+
+        self._size_to_canvas(figure)
+        figure.tight_layout(pad=2.5)
+        # Not cached, the month charts get attached again when shown
+        self._attach(ChartEntry(figure, [], 0))
+        self.canvas.draw()
+
+    def _build(self, month: str, categories: List[str], version: int, totals: pd.DataFrame) -> ChartEntry:
+        # Create a long-form dataframe with the data
+        data = (totals.rename(columns={'allotted': 'Allotted', 'spending': 'Spending'})
+                .rename_axis('expenses')
+                .reset_index()
+                .melt(id_vars='expenses', var_name='types', value_name='amounts'))
+
+        figure = self._new_figure()
+        entry = ChartEntry(figure, categories, version)
+        axes = entry.axes
+
+        # Create a bar chart with seaborn
+        sns.barplot(x="amounts", y="expenses", hue="types", hue_order=TYPES, data=data, ax=axes)
+        axes.set_title(f'{month} Budget')
+        axes.set_xlabel('Amount')
+        axes.set_ylabel('Expense')
+
+        # Remove the top and right spines
+        sns.despine(ax=axes, offset=10)
+
+        # Add labels and numbers to the barplot
+        for container in axes.containers:
+            entry.bars.append(list(container.patches))
+            entry.labels.append(axes.bar_label(container, fmt='%.2f'))
+
+        # The amounts are drawn on top of the cached background, see _on_draw
+        for artist in entry.animated():
+            artist.set_animated(True)
+
+        self._size_to_canvas(figure)
+        # Adjust the spacing and padding
+        figure.tight_layout(pad=2.5)
+        figure.canvas.mpl_connect('draw_event', self._on_draw)
+        return entry
+
+    def _size_to_canvas(self, figure: Figure) -> None:
+        ratio = self.canvas.device_pixel_ratio
+        figure.set_size_inches(self.canvas.width() * ratio / figure.dpi,
+                               self.canvas.height() * ratio / figure.dpi,
+                               forward=False)
+
+    def _attach(self, entry: ChartEntry) -> None:
+        # A figure that was never attached keeps the canvas it got at
+        # creation, the draw_event callbacks live on the figure itself.
+        self._size_to_canvas(entry.figure)
+        entry.figure.set_canvas(self.canvas)
+        self.canvas.figure = entry.figure
+        self._current = entry
+
+    def _update(self, entry: ChartEntry, version: int, totals: pd.DataFrame) -> bool:
+        """
+        Sets the new amounts on the existing bars, returns True when the
+        axis had to be rescaled and the whole figure needs a redraw
+        """
+        entry.version = version
+        columns = [totals['allotted'].to_numpy(), totals['spending'].to_numpy()]
+        for bars, labels, values in zip(entry.bars, entry.labels, columns):
+            for bar, label, value in zip(bars, labels, values):
+                bar.set_width(value)
+                label.set_text(f'{value:.2f}')
+                label.xy = (value, label.xy[1])
+
+        largest = max(values.max() for values in columns)
+        if largest > entry.axes.get_xlim()[1]:
+            # The bars don't fit anymore, rescale the axis.
+            entry.axes.relim()
+            entry.axes.autoscale_view()
+            return True
+        return False
+
+    def _blit(self, entry: ChartEntry) -> None:
+        self.canvas.restore_region(entry.background)
+        for artist in entry.animated():
+            entry.figure.draw_artist(artist)
+        self.canvas.blit(entry.figure.bbox)
+
+    def _on_draw(self, event) -> None:
+        entry = self._current
+        if entry is None or event.canvas.figure is not entry.figure:
+            return
+        entry.background = self.canvas.copy_from_bbox(entry.figure.bbox)
+        for artist in entry.animated():
+            entry.figure.draw_artist(artist)
@@ -0,0 +1,236 @@
+"""
+Command line of the budget, runs without Qt or tkinter.
+
+    python budgetCli.py import budget.json statement.csv [statement.ofx ...]
+    python budgetCli.py rollup budget.json [other.json ...] [--year 2023] [--month January]
+    python budgetCli.py report budget.json [other.json ...] [--year 2023] [--month January] [--format csv]
+    python budgetCli.py trends budget.json [--view year-over-year] [--category Food] [--format csv]
+    python budgetCli.py carry-over budget.json 2023 January 2023 February [--months 11]
+    python budgetCli.py export budget.json [--transactions] [--format json] [-o out.csv]
+    python budgetCli.py convert budget.json budget.json.gz
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from typing import Iterator, List, Tuple
+
+from budgetApp import Budget, following_months
+from budgetMoney import Money, to_json
+from budgetTrace import tracer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+EXPENSE_COLUMNS = ['year', 'month', 'category', 'expense', 'allotted', 'spending', 'comment']
+TRANSACTION_COLUMNS = ['id', 'year', 'month', 'category', 'expense', 'amount', 'comment']
+REPORT_COLUMNS = ['budget', 'category', 'allotted', 'spending', 'remaining']
+
+
+def months_of(budget: Budget, year: str = None, month: str = None) -> List[Tuple[str, str]]:
+    return [(data_year, data_month)
+            for data_year, year_data in budget.data.items() if year is None or data_year == year
+            for data_month in year_data if month is None or data_month == month]
+
+
+def expense_rows(budget: Budget, year: str = None, month: str = None) -> Iterator[list]:
+    for data_year, data_month in months_of(budget, year, month):
+        for category, category_data in budget.data[data_year][data_month].items():
+            for expense, expense_data in category_data.items():
+                yield [data_year, data_month, category, expense, Money.parse(expense_data["Allotted"]),
+                       Money.parse(expense_data["Spending"]), expense_data["Comment"]]
+
+
+def command_import(args) -> int:
+    from budgetImport import CsvFormat, StatementImporter, read_statement
+
+    budget = Budget(args.budget)
+    csv_format = CsvFormat(delimiter=args.delimiter, decimal=args.decimal, thousands=args.thousands)
+    for statement in args.statements:
+        start = time.perf_counter()
+        importer = StatementImporter(budget, read_statement(statement, csv_format), budget.categorizer).run()
+        print(f'{statement}: {importer.imported} imported, {importer.duplicates} already in the budget, '
+              f'{importer.skipped} skipped ({time.perf_counter() - start:.2f} s)')
+    return 0
+
+
+def command_rollup(args) -> int:
+    for budget_file in args.budgets:
+        budget = Budget(budget_file)
+        months = months_of(budget, args.year, args.month)
+        for year, month in months:
+            budget.update_spending_from_transactions(year, month)
+        budget.save()
+        print(f'{budget_file}: spending of {len(months)} month(s) set from the transactions')
+    return 0
+
+
+def command_report(args) -> int:
+    rows = []
+    for budget_file in args.budgets:
+        totals = Budget(budget_file).totals(args.year, args.month)
+        for category, (allotted, spending) in totals.items():
+            rows.append([budget_file, category, allotted, spending, allotted - spending])
+        if len(totals) > 1:
+            allotted = sum(total[0] for total in totals.values())
+            spending = sum(total[1] for total in totals.values())
+            rows.append([budget_file, 'Overall', allotted, spending, allotted - spending])
+
+    if args.format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(REPORT_COLUMNS)
+        writer.writerows(rows)
+    elif args.format == 'json':
+        json.dump([dict(zip(REPORT_COLUMNS, row)) for row in rows], sys.stdout, indent=4, default=to_json)
+        print()
+    else:
+        width = max([len(row[1]) for row in rows] + [8])
+        for budget_file in args.budgets:
+            print(budget_file)
+            for _, category, allotted, spending, remaining in (row for row in rows if row[0] == budget_file):
+                print(f'  {category:<{width}} {str(allotted):>12} {str(spending):>12} {str(remaining):>12}')
+    return 0
+
+
+def command_trends(args) -> int:
+    reports = Budget(args.budget).reports
+    if args.view == 'monthly':
+        table = reports.monthly(args.category)
+    elif args.view == 'year-over-year':
+        table = reports.year_over_year(args.field, args.category, args.change)
+    elif args.view == 'rolling':
+        table = reports.rolling_average(args.window, args.field, args.category)
+    else:
+        table = reports.overspend_streaks(args.window, args.category)
+
+    if args.format == 'csv':
+        table.to_csv(sys.stdout, index=args.view != 'streaks')
+    else:
+        print(table.to_string(index=args.view != 'streaks'))
+    return 0
+
+
+def command_carry_over(args) -> int:
+    budget = Budget(args.budget)
+    if args.from_month not in budget.data.get(args.from_year, {}):
+        print(f'no month {args.from_month} {args.from_year} in {args.budget}', file=sys.stderr)
+        return 1
+    targets = [(args.to_year, args.to_month)] + following_months(args.to_year, args.to_month, args.months - 1)
+    carried = budget.roll_forward((args.from_year, args.from_month), targets, overwrite=args.overwrite)
+    budget.save()
+    print(f'{carried} expense(s) of {args.from_month} {args.from_year} carried over to {len(targets)} month(s) '
+          f'starting at {args.to_month} {args.to_year}')
+    return 0
+
+
+def command_export(args) -> int:
+    budget = Budget(args.budget)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        if args.transactions:
+            rows = ([getattr(transaction, column) for column in TRANSACTION_COLUMNS]
+                    for transaction in budget.transactions
+                    if (args.year is None or transaction.year == args.year)
+                    and (args.month is None or transaction.month == args.month))
+            columns = TRANSACTION_COLUMNS
+        else:
+            rows = expense_rows(budget, args.year, args.month)
+            columns = EXPENSE_COLUMNS
+        if args.format == 'json':
+            json.dump([dict(zip(columns, row)) for row in rows], output, indent=4, default=to_json)
+            output.write('\n')
+        else:
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            writer.writerows(rows)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+def command_convert(args) -> int:
+    from budgetStorage import convert_json
+
+    convert_json(args.budget, args.destination, True if args.gzip else None)
+    print(f'{args.budget} written to {args.destination}')
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--verbose', action='store_true', help='log what the budget does')
+    parser.add_argument('--trace', help='write a Chrome trace of the command to this file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import', help='import CSV/OFX bank statements')
+    command.add_argument('budget')
+    command.add_argument('statements', nargs='+')
+    command.add_argument('--delimiter', default=',', help='column delimiter of the CSV statements')
+    command.add_argument('--decimal', default='.', help='decimal separator of the CSV amounts')
+    command.add_argument('--thousands', default=',', help='thousands separator of the CSV amounts, may be empty')
+    command.set_defaults(run=command_import)
+
+    command = commands.add_parser('rollup', help='set the spending of the expenses from their transactions')
+    command.add_argument('budgets', nargs='+')
+    command.set_defaults(run=command_rollup)
+
+    command = commands.add_parser('report', help='allotted and spending per category')
+    command.add_argument('budgets', nargs='+')
+    command.add_argument('--format', choices=('text', 'csv', 'json'), default='text')
+    command.set_defaults(run=command_report)
+
+    command = commands.add_parser('trends', help='monthly, year-over-year, rolling average or overspending trends')
+    command.add_argument('budget')
+    command.add_argument('--view', choices=('monthly', 'year-over-year', 'rolling', 'streaks'), default='monthly')
+    command.add_argument('--category')
+    command.add_argument('--field', choices=('allotted', 'spending'), default='spending')
+    command.add_argument('--change', action='store_true', help='year-over-year relative change')
+    command.add_argument('--window', type=int, default=3,
+                         help='months averaged by rolling, shortest streak listed by streaks')
+    command.add_argument('--format', choices=('text', 'csv'), default='text')
+    command.set_defaults(run=command_trends)
+
+    command = commands.add_parser('carry-over', help="copy a month's expenses into the following months")
+    command.add_argument('budget')
+    command.add_argument('from_year')
+    command.add_argument('from_month')
+    command.add_argument('to_year')
+    command.add_argument('to_month')
+    command.add_argument('--months', type=int, default=1, help='number of months to fill from to_month on')
+    command.add_argument('--overwrite', action='store_true', help='replace the expenses the months already have')
+    command.set_defaults(run=command_carry_over)
+
+    command = commands.add_parser('export', help='write the expenses or the transactions as CSV or JSON')
+    command.add_argument('budget')
+    command.add_argument('-o', '--output', default='-', help='output file, stdout by default')
+    command.add_argument('--format', choices=('csv', 'json'), default='csv')
+    command.add_argument('--transactions', action='store_true', help='export the transactions instead')
+    command.set_defaults(run=command_export)
+
+    command = commands.add_parser('convert', help='copy a JSON budget, gzipped when the name ends with .gz')
+    command.add_argument('budget')
+    command.add_argument('destination')
+    command.add_argument('--gzip', action='store_true', help='compress whatever the name')
+    command.set_defaults(run=command_convert)
+
+    for name in ('rollup', 'report', 'export'):
+        commands.choices[name].add_argument('--year')
+        commands.choices[name].add_argument('--month')
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    # Without a handler only the warnings of the modules get printed
+    if args.verbose:
+        logging.basicConfig(format='%(name)s: %(message)s')
+    if args.trace:
+        tracer.trace_to(args.trace)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
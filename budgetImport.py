@@ -0,0 +1,313 @@
+import calendar
+import csv
+import json
+import logging
+import re
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from budgetMoney import Money
+from budgetTrace import span
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Transactions committed to the budget at once
+BATCH_SIZE = 2000
+# Characters of an OFX file read at once
+CHUNK_SIZE = 64 * 1024
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d.%m.%Y', '%Y/%m/%d')
+# Where the rows that match no rule go, None skips them
+DEFAULT_EXPENSE = ('Uncategorized', 'Other')
+RULES_FILE = 'import_rules.json'
+# Imported transactions get ids derived from the statement, importing the
+# same statement twice finds the ids already in the ledger
+IMPORT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'budgetApp/import')
+
+
+class StatementEntry(NamedTuple):
+    year: str
+    month: str
+    day: int
+    # Signed as on the statement, money going out is negative
+    amount: Money
+    description: str
+    # Bank id of the transaction (OFX FITID), empty when the statement has none
+    reference: str = ''
+
+
+class CsvFormat(NamedTuple):
+    """
+    Column names and number format of a CSV statement, European
+    statements write 1.234,56: decimal=',' and thousands='.'
+    """
+    date: str = 'Date'
+    amount: str = 'Amount'
+    description: str = 'Description'
+    date_formats: Sequence[str] = DATE_FORMATS
+    delimiter: str = ','
+    decimal: str = '.'
+    thousands: str = ','
+
+
+def _entry(date: datetime, amount: Money, description: str, reference: str = '') -> StatementEntry:
+    return StatementEntry(str(date.year), calendar.month_name[date.month], date.day, amount,
+                          ' '.join(description.split()), reference)
+
+
+# A statement only spans a few hundred distinct dates
+@lru_cache(maxsize=4096)
+def _parse_date(value: str, formats: Sequence[str]) -> datetime:
+    value = value.strip()
+    for date_format in formats:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f'unknown date format: {value!r}')
+
+
+@lru_cache(maxsize=16)
+def _amount_pattern(decimal: str, thousands: str) -> re.Pattern:
+    digits = rf'\d{{1,3}}(?:{re.escape(thousands)}\d{{3}})+|\d+' if thousands else r'\d+'
+    return re.compile(rf'([+-]?)({digits})(?:{re.escape(decimal)}(\d{{1,2}}))?')
+
+
+def _parse_amount(value: str, decimal: str = '.', thousands: str = ',') -> Money:
+    """
+    Reads a statement amount with the given separators, raises
+    ValueError on anything else (1,5 with a '.' decimal separator)
+    rather than guessing what was meant
+    """
+    match = _amount_pattern(decimal, thousands).fullmatch(value.strip())
+    if match is None:
+        raise ValueError(f'not an amount with {decimal!r} decimals and {thousands!r} thousands: {value!r}')
+    sign, units, fraction = match.groups()
+    return Money.parse(f'{sign}{units.replace(thousands, "") if thousands else units}.{fraction or 0}')
+
+
+def read_csv(file_path, csv_format: CsvFormat = CsvFormat()) -> Iterator[StatementEntry]:
+    """
+    Streams the entries of a CSV statement, rows that can't be read are logged and skipped
+    """
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.DictReader(csvfile, delimiter=csv_format.delimiter)
+        for line, row in enumerate(reader, 2):
+            try:
+                yield _entry(_parse_date(row[csv_format.date], csv_format.date_formats),
+                             _parse_amount(row[csv_format.amount], csv_format.decimal, csv_format.thousands),
+                             row.get(csv_format.description) or '')
+            except (KeyError, AttributeError, ValueError) as error:
+                logger.warning(f'{file_path}:{line}: skipping row, {error}')
+
+
+# OFX is SGML (1.x, leaf elements are not closed) or XML (2.x), either way
+# every value is the text between a tag and the next one
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def read_ofx(file_path, chunk_size: int = CHUNK_SIZE) -> Iterator[StatementEntry]:
+    """
+    Streams the STMTTRN entries of an OFX/QFX statement, reading the file in chunks
+    """
+    transaction: Optional[Dict[str, str]] = None
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as ofxfile:
+        buffer = ''
+        while True:
+            chunk = ofxfile.read(chunk_size)
+            buffer += chunk
+            # The value of the last tag may go on in the next chunk, a
+            # buffer without any tag start is kept whole until one shows up
+            end = max(buffer.rfind('<'), 0) if chunk else len(buffer)
+            for match in _OFX_TAG.finditer(buffer, 0, end):
+                closing, tag, value = match.groups()
+                tag = tag.upper()
+                if tag == 'STMTTRN':
+                    if closing and transaction is not None:
+                        try:
+                            # OFX amounts have no thousands separator, the decimal one is . or ,
+                            amount = transaction['TRNAMT']
+                            yield _entry(datetime.strptime(transaction['DTPOSTED'][:8], '%Y%m%d'),
+                                         _parse_amount(amount, ',' if ',' in amount else '.', ''),
+                                         ' '.join(filter(None, (transaction.get('NAME'), transaction.get('MEMO')))),
+                                         transaction.get('FITID', ''))
+                        except (KeyError, ValueError) as error:
+                            logger.warning(f'{file_path}: skipping transaction {transaction}, {error}')
+                    transaction = None if closing else {}
+                elif transaction is not None and not closing and value.strip():
+                    transaction[tag] = value.strip()
+            if not chunk:
+                break
+            buffer = buffer[end:]
+
+
+def read_statement(file_path, csv_format: CsvFormat = CsvFormat()) -> Iterator[StatementEntry]:
+    """
+    Picks the parser from the extension of the statement file
+    """
+    if Path(file_path).suffix.lower() in ('.ofx', '.qfx'):
+        return read_ofx(file_path)
+    return read_csv(file_path, csv_format)
+
+
+class ImportRule(NamedTuple):
+    pattern: "re.Pattern"
+    category: str
+    expense: str
+
+
+# Backreferences (\1 or (?P=name)) of a rule pattern
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class ImportRules:
+    """
+    Maps statement descriptions to (category, expense), the first listed
+    rule that matches wins. The patterns are compiled into one regex
+    matched once per description, a lookahead per rule tells which of
+    them match. Patterns with backreferences are searched one by one,
+    their group numbers would change in the combined regex.
+
+    :Example:
+
+    [{"pattern": "tesco|lidl", "category": "Food", "expense": "Groceries"},
+    ... {"pattern": "^rent ", "category": "Rent", "expense": "Rent"}]
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str, str]] = ()):
+        self.rules = [ImportRule(re.compile(pattern, re.IGNORECASE), category, expense)
+                      for pattern, category, expense in rules]
+        combined = [number for number, rule in enumerate(self.rules)
+                    if not _BACKREFERENCE.search(rule.pattern.pattern)]
+        self._separate = [number for number, rule in enumerate(self.rules)
+                          if _BACKREFERENCE.search(rule.pattern.pattern)]
+        self._combined = None
+        # (rule number, group of the rule in the combined regex)
+        self._groups: List[Tuple[int, int]] = []
+        if combined:
+            lookaheads = (rf'(?:(?=[\s\S]*?(?P<_rule{number}>{self.rules[number].pattern.pattern})))?'
+                          for number in combined)
+            try:
+                self._combined = re.compile(''.join(lookaheads), re.IGNORECASE)
+            except re.error:
+                # e.g. the same group name in two rules
+                logger.warning('import rules are matched one by one')
+                self._combined = None
+                self._separate = list(range(len(self.rules)))
+            else:
+                self._groups = [(number, self._combined.groupindex[f'_rule{number}']) for number in combined]
+
+    @classmethod
+    def from_file(cls, file_path) -> "ImportRules":
+        """
+        Reads the rules from a JSON list, a missing file gives no rules
+        """
+        try:
+            with open(file_path, 'r') as rulesfile:
+                rules = json.load(rulesfile)
+        except FileNotFoundError:
+            return cls()
+        return cls((rule['pattern'], rule['category'], rule['expense']) for rule in rules)
+
+    def match(self, description: str) -> Optional[Tuple[str, str]]:
+        first = len(self.rules)
+        if self._combined is not None:
+            spans = self._combined.match(description).regs
+            first = next((number for number, group in self._groups if spans[group][0] != -1), first)
+        for number in self._separate:
+            if number >= first:
+                break
+            if self.rules[number].pattern.search(description):
+                first = number
+                break
+        if first == len(self.rules):
+            return None
+        rule = self.rules[first]
+        return rule.category, rule.expense
+
+
+class StatementImporter:
+    """
+    Turns statement entries into transactions of the budget.
+
+    The entries are consumed lazily and committed in batches of
+    batch_size, so memory stays bounded by one batch whatever the size
+    of the statement. Money going out becomes spending, credits are
+    skipped. Ids are derived from the statement so entries already in
+    the ledger are recognized and dropped. The rules are anything with a
+    match(description) method, ImportRules or a learned Categorizer.
+
+    run() imports everything at once, the UI calls step() from its
+    event loop instead so it stays responsive.
+    """
+
+    def __init__(self, budget, entries: Iterable[StatementEntry], rules=None,
+                 default: Optional[Tuple[str, str]] = DEFAULT_EXPENSE, batch_size: int = BATCH_SIZE):
+        self.budget = budget
+        self.rules = rules or ImportRules()
+        self.default = default
+        self.batch_size = batch_size
+        self.imported = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self._entries = iter(entries)
+        # Identical entries of one statement (two coffees on the same day)
+        # are told apart by their occurrence
+        self._occurrences: Dict[str, int] = {}
+
+    def _transaction_id(self, entry: StatementEntry) -> str:
+        if entry.reference:
+            key = f'ref|{entry.reference}'
+        else:
+            key = f'{entry.year}|{entry.month}|{entry.day}|{entry.amount.cents}|{entry.description}'
+            occurrence = self._occurrences.get(key, 0)
+            self._occurrences[key] = occurrence + 1
+            key = f'{key}|{occurrence}'
+        return str(uuid.uuid5(IMPORT_NAMESPACE, key))
+
+    def _next_batch(self) -> List[tuple]:
+        batch = []
+        batch_ids = set()
+        for entry in self._entries:
+            spending = -entry.amount
+            if spending.cents <= 0:
+                self.skipped += 1
+                continue
+            expense = self.rules.match(entry.description) or self.default
+            if expense is None:
+                self.skipped += 1
+                continue
+            transaction_id = self._transaction_id(entry)
+            if transaction_id in batch_ids or self.budget.transactions.get(transaction_id) is not None:
+                self.duplicates += 1
+                continue
+            batch_ids.add(transaction_id)
+            # Ordered as the fields of a stored ledger row
+            batch.append((spending, expense[0], expense[1], entry.description,
+                          transaction_id, entry.year, entry.month))
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def step(self) -> bool:
+        """
+        Imports the next batch, returns False once the statement is exhausted
+        """
+        with span('import batch'):
+            batch = self._next_batch()
+            if batch:
+                self.budget.add_transactions(batch)
+        if not batch:
+            logger.info(f'imported {self.imported} transaction(s), '
+                        f'{self.duplicates} duplicate(s), {self.skipped} skipped')
+            return False
+        self.imported += len(batch)
+        return True
+
+    def run(self) -> "StatementImporter":
+        while self.step():
+            pass
+        return self
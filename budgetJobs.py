@@ -0,0 +1,71 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class JobListener:
+    """
+    Told about the jobs from the worker thread, the UI forwards these to Qt signals
+    """
+
+    def job_started(self, name: str) -> None:
+        pass
+
+    def job_finished(self, name: str, result) -> None:
+        pass
+
+    def job_failed(self, name: str, error: Exception) -> None:
+        pass
+
+
+class JobQueue:
+    """
+    Runs the storage and aggregation work of the budget off the GUI thread.
+
+    A single worker runs the jobs in submission order, so the storage
+    never sees two of them at once. A coalesced job that is still waiting
+    for the worker is not queued again: every save requested while a slow
+    one runs ends up in one more save, which picks up all their changes.
+    The arguments of a coalesced submit are dropped, so only jobs that
+    read their input when they run (save, prefetch) should coalesce.
+    """
+
+    def __init__(self, listener: JobListener = None):
+        self.listener = listener or JobListener()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='budget-job')
+        self._queued: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, fn: Callable, *args, coalesce: bool = False) -> Future:
+        with self._lock:
+            queued = self._queued.get(name)
+            if coalesce and queued is not None and not queued.running() and not queued.done():
+                logger.info(f'{name} coalesced with the queued one')
+                return queued
+            future = self._executor.submit(self._run, name, fn, *args)
+            self._queued[name] = future
+        return future
+
+    def _run(self, name: str, fn: Callable, *args):
+        self.listener.job_started(name)
+        try:
+            result = fn(*args)
+        except Exception as error:
+            logger.exception(f'{name} failed')
+            self.listener.job_failed(name, error)
+            raise
+        self.listener.job_finished(name, result)
+        return result
+
+    def wait(self) -> None:
+        """
+        Blocks until the jobs submitted so far are done
+        """
+        self._executor.submit(lambda: None).result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,364 @@
+import atexit
+import heapq
+import json
+import logging
+import os
+import threading
+import uuid
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from budgetMoney import Money, to_json
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+LEDGER_SUFFIX = '.transactions'
+# Group commit: the pending records are written once this many piled up
+# or FLUSH_INTERVAL seconds after the first of them, whichever comes first.
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 0.25
+
+# Order of the fields in a stored record, matches the Transaction constructor
+FIELDS = ('amount', 'category', 'expense', 'comment', 'id', 'year', 'month')
+ID_MASK = (1 << 64) - 1
+# Ids added after the id index was sorted are looked up in a dict until
+# there are more than this many of them, or an eighth of the index
+MIN_RECENT_IDS = 1024
+
+
+class TransactionRow:
+    """
+    Read-only view of one row of a TransactionLedger, the values are
+    read from the ledger columns on access
+    """
+    __slots__ = ('_ledger', '_row')
+
+    def __init__(self, ledger: "TransactionLedger", row: int):
+        self._ledger = ledger
+        self._row = row
+
+    @property
+    def amount(self) -> Money:
+        return Money(self._ledger._amounts[self._row])
+
+    @property
+    def comment(self) -> str:
+        return self._ledger._comments[self._row]
+
+    @property
+    def id(self) -> str:
+        return str(uuid.UUID(int=self._ledger._id_int(self._row)))
+
+    @property
+    def year(self) -> str:
+        return self._key()[0]
+
+    @property
+    def month(self) -> str:
+        return self._key()[1]
+
+    @property
+    def category(self) -> str:
+        return self._key()[2]
+
+    @property
+    def expense(self) -> str:
+        return self._key()[3]
+
+    def _key(self) -> Tuple[str, str, str, str]:
+        return self._ledger._keys[self._ledger._row_keys[self._row]]
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return (f'TransactionRow(amount={self.amount!r}, category={self.category!r}, expense={self.expense!r}, '
+                f'comment={self.comment!r}, id={self.id!r}, year={self.year!r}, month={self.month!r})')
+
+
+class TransactionLedger:
+    """
+    Insertion ordered collection of the transactions, stored column-wise.
+
+    Every transaction is a row of typed arrays: its amount as fixed-point
+    cents, its uuid as two 64 bit halves and the index of its interned
+    (year, month, category, expense) key. Comments are deduplicated and
+    the rows are read through TransactionRow views, so a transaction costs
+    a few dozen bytes instead of a dataclass with its own strings. The
+    rows of every key and their running sum are kept up to date for the
+    per month and per expense lookups, deleted rows are only flagged.
+
+    Lookups by id go through the id halves sorted into arrays, searched
+    with bisect. Rows added after the sort are kept in a small dict
+    until there are enough of them to sort the arrays again.
+    """
+
+    def __init__(self, transactions: Iterable = ()):
+        self._amounts = array('q')
+        self._id_high = array('Q')
+        self._id_low = array('Q')
+        self._row_keys = array('I')
+        self._alive = bytearray()
+        self._comments: List[str] = []
+        self._strings: Dict[str, str] = {}
+        # Interned (year, month, category, expense) keys with their rows and sum of the amounts
+        self._keys: List[Tuple[str, str, str, str]] = []
+        self._key_ids: Dict[Tuple[str, str, str, str], int] = {}
+        self._key_rows: List[array] = []
+        self._key_sums = array('q')
+        self._month_keys: Dict[Tuple[str, str], List[int]] = {}
+        self._expense_keys: Dict[Tuple[str, str], List[int]] = {}
+        # Built on the first lookup by id, loading a ledger doesn't need it
+        self._index_high: Optional[array] = None
+        self._index_low = array('Q')
+        self._index_rows = array('I')
+        self._recent: Dict[int, int] = {}
+        self._live = 0
+        for transaction in transactions:
+            self.add(transaction)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[list]) -> "TransactionLedger":
+        """
+        Builds the ledger from stored rows, ordered as FIELDS
+        """
+        ledger = cls()
+        for row in rows:
+            ledger.add_row(*row)
+        return ledger
+
+    def add(self, transaction) -> TransactionRow:
+        return self.add_row(transaction.amount, transaction.category, transaction.expense, transaction.comment,
+                            transaction.id, transaction.year, transaction.month)
+
+    def add_row(self, amount, category: str, expense: str, comment: str, transaction_id: str,
+                year: str = '', month: str = '') -> TransactionRow:
+        id_int = uuid.UUID(transaction_id).int
+        if self._index_high is not None and self._find(id_int) is not None:
+            self.discard(self.get(transaction_id))
+        key_id = self._key_id((year, month, category, expense))
+        cents = Money.parse(amount).cents
+        row = len(self._amounts)
+        self._amounts.append(cents)
+        self._id_high.append(id_int >> 64)
+        self._id_low.append(id_int & ID_MASK)
+        self._row_keys.append(key_id)
+        self._alive.append(1)
+        self._comments.append(self._strings.setdefault(comment, comment))
+        self._key_rows[key_id].append(row)
+        self._key_sums[key_id] += cents
+        if self._index_high is not None:
+            self._recent[id_int] = row
+            if len(self._recent) > max(MIN_RECENT_IDS, len(self._index_rows) // 8):
+                self._sort_ids()
+        self._live += 1
+        return TransactionRow(self, row)
+
+    def _key_id(self, key: Tuple[str, str, str, str]) -> int:
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key = tuple(self._strings.setdefault(value, value) for value in key)
+            key_id = len(self._keys)
+            self._keys.append(key)
+            self._key_ids[key] = key_id
+            self._key_rows.append(array('I'))
+            self._key_sums.append(0)
+            self._month_keys.setdefault(key[:2], []).append(key_id)
+            self._expense_keys.setdefault(key[2:], []).append(key_id)
+        return key_id
+
+    def _id_int(self, row: int) -> int:
+        return (self._id_high[row] << 64) | self._id_low[row]
+
+    def _sort_ids(self) -> None:
+        rows = [row for row in range(len(self._alive)) if self._alive[row]]
+        # uuids differ in their high half, equal ones are told apart by the low half on lookup
+        rows.sort(key=self._id_high.__getitem__)
+        self._index_high = array('Q', (self._id_high[row] for row in rows))
+        self._index_low = array('Q', (self._id_low[row] for row in rows))
+        self._index_rows = array('I', rows)
+        self._recent = {}
+
+    def _find(self, id_int: int) -> Optional[int]:
+        row = self._recent.get(id_int)
+        if row is not None:
+            return row
+        high, low = id_int >> 64, id_int & ID_MASK
+        position = bisect_left(self._index_high, high)
+        while position < len(self._index_high) and self._index_high[position] == high:
+            row = self._index_rows[position]
+            # Deleted rows stay in the sorted arrays until they are sorted again
+            if self._index_low[position] == low and self._alive[row]:
+                return row
+            position += 1
+        return None
+
+    def _row(self, transaction_id: str) -> Optional[int]:
+        if self._index_high is None:
+            self._sort_ids()
+        try:
+            return self._find(uuid.UUID(transaction_id).int)
+        except (TypeError, ValueError):
+            return None
+
+    def discard(self, transaction) -> None:
+        row = self._row(transaction.id)
+        if row is None:
+            return
+        key_id = self._row_keys[row]
+        self._alive[row] = 0
+        self._key_rows[key_id].remove(row)
+        self._key_sums[key_id] -= self._amounts[row]
+        self._recent.pop(self._id_int(row), None)
+        self._live -= 1
+
+    def get(self, transaction_id: str) -> Optional[TransactionRow]:
+        row = self._row(transaction_id)
+        return None if row is None else TransactionRow(self, row)
+
+    def _views(self, key_ids: Iterable[int]) -> List[TransactionRow]:
+        return [TransactionRow(self, row) for row in heapq.merge(*(self._key_rows[key_id] for key_id in key_ids))]
+
+    def for_expense(self, category: str, expense: str) -> List[TransactionRow]:
+        return self._views(self._expense_keys.get((category, expense), ()))
+
+    def for_month(self, year: str, month: str) -> List[TransactionRow]:
+        return self._views(self._month_keys.get((year, month), ()))
+
+    def total(self, year: str, month: str, category: str, expense: str) -> Money:
+        """
+        Sum of the amounts of the expense in the month
+        """
+        key_id = self._key_ids.get((year, month, category, expense))
+        return Money() if key_id is None else Money(self._key_sums[key_id])
+
+    def month_totals(self, year: str, month: str) -> Dict[Tuple[str, str], Money]:
+        """
+        Sum of the amounts per (category, expense) of the month
+        """
+        return {self._keys[key_id][2:]: Money(self._key_sums[key_id])
+                for key_id in self._month_keys.get((year, month), ())
+                if self._key_rows[key_id]}
+
+    def __contains__(self, transaction) -> bool:
+        transaction_id = getattr(transaction, 'id', None)
+        return transaction_id is not None and self._row(transaction_id) is not None
+
+    def __iter__(self) -> Iterator[TransactionRow]:
+        return iter([TransactionRow(self, row) for row in range(len(self._alive)) if self._alive[row]])
+
+    def __len__(self) -> int:
+        return self._live
+
+
+class LedgerLog:
+    """
+    Durable, append-only log of the transactions with group commit.
+
+    Adding or deleting a transaction only queues a record, the queue is
+    written (and fsynced) in one go every BATCH_SIZE records or
+    FLUSH_INTERVAL seconds, so entering hundreds of transactions costs a
+    handful of disk writes. on_commit is called at every commit before
+    the records are written, the budget writes the spending of the
+    transactions there so both are committed together.
+    """
+
+    def __init__(self, file_path, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 on_commit: Optional[Callable[[], None]] = None):
+        file_path = Path(file_path)
+        self.log_path = file_path.with_name(file_path.name + LEDGER_SUFFIX)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_commit = on_commit
+        self._pending: List[str] = []
+        # _lock guards the queue, _log_lock the log file, queuing never
+        # waits for the fsync of a flush in progress
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+
+    def append(self, transaction) -> None:
+        self._queue({'op': 'add', 'row': [getattr(transaction, name) for name in FIELDS]})
+
+    def remove(self, transaction) -> None:
+        self._queue({'op': 'del', 'id': transaction.id})
+
+    def extend(self, transactions: Iterable) -> None:
+        """
+        Appends a batch of transactions in a single write
+        """
+        records = [json.dumps({'op': 'add', 'row': [getattr(transaction, name) for name in FIELDS]},
+                              separators=(',', ':'), default=to_json)
+                   for transaction in transactions]
+        with self._lock:
+            self._pending.extend(records)
+        self.flush()
+
+    def _queue(self, record: dict) -> None:
+        with self._lock:
+            self._pending.append(json.dumps(record, separators=(',', ':'), default=to_json))
+            full = len(self._pending) >= self.batch_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._log_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, []
+            if self.on_commit is not None:
+                self.on_commit()
+            if not pending:
+                return
+            with open(self.log_path, 'a') as log:
+                log.write('\n'.join(pending) + '\n')
+                log.flush()
+                os.fsync(log.fileno())
+        logger.info(f'committed {len(pending)} transaction record(s)')
+
+    def load(self) -> List[list]:
+        """
+        Replays the log and returns the live transaction rows in insertion order,
+        the log is rewritten without the dead records when they dominate it
+        """
+        if not self.log_path.exists():
+            return []
+        rows = {}
+        records = 0
+        with open(self.log_path, 'r') as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f'skipping torn ledger record in {self.log_path}')
+                    continue
+                records += 1
+                if record['op'] == 'add':
+                    rows[record['row'][FIELDS.index('id')]] = record['row']
+                else:
+                    rows.pop(record['id'], None)
+        if records > 2 * len(rows):
+            self._rewrite(rows.values())
+        return list(rows.values())
+
+    def _rewrite(self, rows: Iterable[list]) -> None:
+        tmp_path = self.log_path.with_name(self.log_path.name + '.tmp')
+        with open(tmp_path, 'w') as log:
+            for row in rows:
+                log.write(json.dumps({'op': 'add', 'row': row}, separators=(',', ':')) + '\n')
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(tmp_path, self.log_path)
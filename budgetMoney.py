@@ -0,0 +1,123 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import total_ordering
+
+# Money is kept as an integer amount of cents
+CENTS = 100
+AMOUNT_FIELDS = ("Allotted", "Spending")
+
+
+@total_ordering
+class Money:
+    """
+    Fixed-point amount of money in integer cents.
+
+    Amounts are parsed once when they enter the budget (typed in the UI,
+    read from the disk), sums and comparisons are then plain integer
+    operations without float drift.
+
+    :Example:
+
+    Money.parse("12.30") + Money.parse(0.7)
+    ...Money('13.00')
+    """
+    __slots__ = ('cents',)
+
+    def __init__(self, cents: int = 0):
+        self.cents = int(cents)
+
+    @classmethod
+    def parse(cls, value) -> "Money":
+        """
+        Reads an amount given in units, as a string or a number, raises
+        ValueError when the value is not an amount
+        """
+        if isinstance(value, Money):
+            return value
+        if value is None:
+            return cls()
+        if isinstance(value, float):
+            # The shortest repr round-trips, 0.1 is read as 0.1 and not
+            # as its binary approximation
+            value = repr(value)
+        try:
+            amount = Decimal(value if isinstance(value, (str, int)) else str(value))
+        except InvalidOperation:
+            raise ValueError(f'not an amount: {value!r}') from None
+        if not amount.is_finite():
+            raise ValueError(f'not an amount: {value!r}')
+        return cls(int((amount * CENTS).to_integral_value(ROUND_HALF_UP)))
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        if other == 0:
+            return self
+        return NotImplemented
+
+    # sum() starts from 0
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __neg__(self) -> "Money":
+        return Money(-self.cents)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        return NotImplemented
+
+    def __lt__(self, other) -> bool:
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.cents)
+
+    def __bool__(self) -> bool:
+        return self.cents != 0
+
+    def __float__(self) -> float:
+        return self.cents / CENTS
+
+    def __str__(self) -> str:
+        units, cents = divmod(abs(self.cents), CENTS)
+        return f'{"-" if self.cents < 0 else ""}{units}.{cents:02d}'
+
+    def __repr__(self) -> str:
+        return f'Money({str(self)!r})'
+
+    def __format__(self, format_spec: str) -> str:
+        if not format_spec:
+            return str(self)
+        return format(float(self), format_spec)
+
+
+def to_json(value):
+    """
+    default hook of json.dump, amounts are written as canonical decimal strings
+    """
+    if isinstance(value, Money):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def parse_expense(expense_data: dict) -> dict:
+    """
+    Converts the amounts of an expense read from the disk in place
+    """
+    for field_name in AMOUNT_FIELDS:
+        if field_name in expense_data:
+            expense_data[field_name] = Money.parse(expense_data[field_name])
+    return expense_data
+
+
+def parse_month(month_data: dict) -> dict:
+    for category_data in month_data.values():
+        for expense_data in category_data.values():
+            parse_expense(expense_data)
+    return month_data
@@ -0,0 +1,164 @@
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from budgetAggregate import COLUMNS
+from budgetApp import MONTHS
+from budgetMoney import CENTS, Money
+from budgetTrace import span
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+FIELDS = ['allotted', 'spending']
+# Months are ordered by their period, the number of months since year 0
+CUBE_COLUMNS = ['period'] + COLUMNS
+
+
+def period_of(year: str, month: str) -> Optional[int]:
+    try:
+        return int(year) * 12 + MONTHS.index(month)
+    except ValueError:
+        return None
+
+
+def period_index(periods) -> pd.MultiIndex:
+    """
+    (year, month) index of the periods, in the order given
+    """
+    return pd.MultiIndex.from_arrays([[str(period // 12) for period in periods],
+                                      [MONTHS[period % 12] for period in periods]], names=['year', 'month'])
+
+
+class BudgetReports:
+    """
+    Trends of the budget over many months and years.
+
+    The reports are answered from a rollup cube: one row per
+    (year, month, category, expense) with its allotted and spending in
+    integer cents, sorted chronologically. Only the months whose version
+    changed since the last report are rebuilt and swapped in the cube, so
+    a ten-year trend is a couple of grouped sums and not a walk over
+    every month dict.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._cube = self._rows(())
+        self._versions: Dict[Tuple[str, str], int] = {}
+        # The cube is refreshed on the job worker and by the command line
+        self._lock = threading.Lock()
+
+    def cube(self) -> pd.DataFrame:
+        with self._lock:
+            versions = {(year, month): self.budget.month_version(year, month)
+                        for year, year_data in self.budget.data.items() for month in year_data}
+            if versions == self._versions:
+                return self._cube
+
+            stale = [period_of(*key) for key, version in self._versions.items() if versions.get(key) != version]
+            fresh = [key for key, version in versions.items() if self._versions.get(key) != version]
+            with span('rollup cube', months=len(fresh)):
+                cube = self._cube[~self._cube['period'].isin(stale)] if stale else self._cube
+                self._cube = (pd.concat([cube, self._rows(fresh)], ignore_index=True)
+                              .sort_values('period', kind='stable', ignore_index=True))
+            self._versions = versions
+            logger.info(f'rollup cube refreshed, {len(fresh)} month(s) of {len(versions)} rebuilt')
+            return self._cube
+
+    def _rows(self, months) -> pd.DataFrame:
+        """
+        Cube rows of the months, built in one pass over their dicts
+        """
+        rows = []
+        for year, month in months:
+            period = period_of(year, month)
+            if period is None:
+                logger.warning(f'{month} {year} is not a month, left out of the reports')
+                continue
+            month_data = self.budget.data[year][month] or {}
+            rows.extend((period, year, month, category, expense,
+                         Money.parse(expense_data["Allotted"]).cents, Money.parse(expense_data["Spending"]).cents)
+                        for category, category_data in month_data.items()
+                        for expense, expense_data in category_data.items())
+        frame = pd.DataFrame(rows, columns=CUBE_COLUMNS)
+        frame[["period"] + FIELDS] = frame[["period"] + FIELDS].astype(np.int64)
+        return frame
+
+    def _select(self, category: str = None, expense: str = None) -> pd.DataFrame:
+        cube = self.cube()
+        if category is not None:
+            cube = cube[cube['category'] == category]
+        if expense is not None:
+            cube = cube[cube['expense'] == expense]
+        return cube
+
+    def _monthly_cents(self, category: str = None, expense: str = None) -> pd.DataFrame:
+        return self._select(category, expense).groupby('period')[FIELDS].sum()
+
+    def monthly(self, category: str = None, expense: str = None) -> pd.DataFrame:
+        """
+        Allotted and spending of every month, chronologically indexed by (year, month)
+        """
+        totals = self._monthly_cents(category, expense) / CENTS
+        totals.index = period_index(totals.index)
+        return totals
+
+    def year_over_year(self, field: str = 'spending', category: str = None, change: bool = False) -> pd.DataFrame:
+        """
+        The field per month (rows) and year (columns), or with change its
+        relative change against the same month of the previous year
+        """
+        totals = self._monthly_cents(category)[field]
+        table = (pd.DataFrame({'year': totals.index // 12, 'month': totals.index % 12, field: totals.to_numpy()})
+                 .pivot(index='month', columns='year', values=field) / CENTS)
+        if change:
+            table = table.pct_change(axis='columns', fill_method=None)
+        table.index = [MONTHS[month] for month in table.index]
+        table.columns = [str(year) for year in table.columns]
+        return table
+
+    def rolling_average(self, window: int = 3, field: str = 'spending', category: str = None) -> pd.DataFrame:
+        """
+        The field of every category averaged over the last window months,
+        months missing from the budget are left out of the average
+        """
+        cube = self._select(category)
+        table = cube.pivot_table(index='period', columns='category', values=field, aggfunc='sum')
+        if table.empty:
+            return table
+        table = table.reindex(range(table.index.min(), table.index.max() + 1))
+        table = table.rolling(window, min_periods=1).mean() / CENTS
+        table.index = period_index(table.index)
+        return table.dropna(how='all')
+
+    def overspend_streaks(self, min_months: int = 2, category: str = None) -> pd.DataFrame:
+        """
+        Runs of consecutive months an expense spent more than allotted,
+        longest first
+        """
+        cube = self._select(category).sort_values(['category', 'expense', 'period'], kind='stable')
+        columns = ['category', 'expense', 'start', 'end', 'months', 'overspent']
+        over = cube[cube['spending'] > cube['allotted']]
+        if over.empty:
+            return pd.DataFrame(columns=columns)
+        # A streak breaks on another expense or a month without overspending
+        same = ((over['category'] == over['category'].shift()) & (over['expense'] == over['expense'].shift())
+                & (over['period'] == over['period'].shift() + 1))
+        streaks = (over.assign(streak=(~same).cumsum(), overspent=over['spending'] - over['allotted'])
+                   .groupby('streak')
+                   .agg(category=('category', 'first'), expense=('expense', 'first'),
+                        first=('period', 'first'), last=('period', 'last'),
+                        months=('period', 'size'), overspent=('overspent', 'sum')))
+        streaks = streaks[streaks['months'] >= min_months]
+        return pd.DataFrame({
+            'category': streaks['category'].to_numpy(),
+            'expense': streaks['expense'].to_numpy(),
+            'start': [f'{MONTHS[period % 12]} {period // 12}' for period in streaks['first']],
+            'end': [f'{MONTHS[period % 12]} {period // 12}' for period in streaks['last']],
+            'months': streaks['months'].to_numpy(),
+            'overspent': streaks['overspent'].to_numpy() / CENTS,
+        }, columns=columns).sort_values(['months', 'overspent'], ascending=False, ignore_index=True)
@@ -0,0 +1,948 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from budgetLedger import BATCH_SIZE, FLUSH_INTERVAL, LEDGER_SUFFIX, LedgerLog
+from budgetMoney import CENTS, Money, parse_expense, parse_month, to_json
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+JOURNAL_SUFFIX = '.journal'
+INDEX_SUFFIX = '.index'
+# Size of the sidecar log (in bytes) after which it gets folded back into
+# the main JSON file.
+COMPACT_THRESHOLD = 256 * 1024
+# Budget files starting with the gzip magic are compressed, whatever their
+# name. New files are compressed when their name ends with .gz
+GZIP_MAGIC = b'\x1f\x8b'
+GZIP_SUFFIX = '.gz'
+# zlib window bits reading a gzip header, and the read size of the indexer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+GZIP_CHUNK_SIZE = 64 * 1024
+
+# Amounts are stored as integer cents, never as floats
+sqlite3.register_adapter(Money, lambda money: money.cents)
+
+
+def is_compressed(file_path) -> bool:
+    try:
+        with open(file_path, 'rb') as jsonfile:
+            return jsonfile.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    except FileNotFoundError:
+        return Path(file_path).suffix.lower() == GZIP_SUFFIX
+
+
+def read_raw(jsonfile) -> bytes:
+    """
+    The JSON bytes of the open budget file, decompressed if needed
+    """
+    jsonfile.seek(0)
+    raw = jsonfile.read()
+    return gzip.decompress(raw) if raw[:len(GZIP_MAGIC)] == GZIP_MAGIC else raw
+
+
+def read_json(file_path) -> dict:
+    with open(file_path, 'rb') as jsonfile:
+        return json.loads(read_raw(jsonfile))
+
+
+# Strings (with escapes) and the brackets outside of them, which is all the
+# month indexer needs to know about the JSON structure.
+_JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+MonthIndex = Dict[str, Dict[str, Tuple[int, ...]]]
+
+
+def index_months(raw: bytes) -> MonthIndex:
+    """
+    Finds the byte range of every year/month object in the raw JSON file.
+
+    :Example:
+
+    index_months(b'{"2023": {"January": {"Food": {}}}}')
+    ...{'2023': {'January': (21, 33)}}
+    """
+    index = {}
+    depth = 0
+    key = year = month = None
+    start = 0
+    for match in _JSON_TOKEN.finditer(raw):
+        token = match.group()
+        if token[:1] == b'"':
+            if depth < 3:
+                key = json.loads(token)
+        elif token in (b'{', b'['):
+            depth += 1
+            if depth == 2:
+                year = key
+                index[year] = {}
+            elif depth == 3:
+                month = key
+                start = match.start()
+        else:
+            if depth == 3:
+                index[year][month] = (start, match.end())
+            depth -= 1
+    return index
+
+
+def _signature(stat: os.stat_result) -> List[int]:
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_index(file_path, jsonfile=None) -> MonthIndex:
+    """
+    Scans the budget file and persists the month offsets next to it
+    """
+    file_path = Path(file_path)
+    if jsonfile is None:
+        with open(file_path, 'rb') as jsonfile:
+            return build_index(file_path, jsonfile)
+    signature = _signature(os.fstat(jsonfile.fileno()))
+    jsonfile.seek(0)
+    if jsonfile.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+        return save_index(file_path, signature, _index_members(jsonfile))
+    return save_index(file_path, signature, index_months(read_raw(jsonfile)))
+
+
+def _index_members(jsonfile) -> MonthIndex:
+    """
+    Indexes a compressed budget file. The months closing a gzip member (the
+    way write_json_atomic writes them) are indexed as (member start, member
+    end, start, end) so they can be read without the rest of the file, the
+    others keep their offsets into the decompressed JSON.
+    """
+    jsonfile.seek(0)
+    parts = []
+    # (compressed start, compressed end, decompressed start, decompressed end)
+    members = []
+    member_start = fed = size = decompressed = 0
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    chunk = b''
+    while True:
+        chunk = chunk or jsonfile.read(GZIP_CHUNK_SIZE)
+        if not chunk:
+            break
+        parts.append(decompressor.decompress(chunk))
+        decompressed += len(parts[-1])
+        fed += len(chunk)
+        chunk = b''
+        if decompressor.eof:
+            chunk = decompressor.unused_data
+            member_end = member_start + fed - len(chunk)
+            members.append((member_start, member_end, size, decompressed))
+            member_start, fed, size = member_end, 0, decompressed
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+    index = index_months(b''.join(parts))
+    member_starts = [member[2] for member in members]
+    for months in index.values():
+        for month, (start, end) in months.items():
+            member = members[bisect_right(member_starts, start) - 1]
+            if end == member[3]:
+                months[month] = (member[0], member[1], start - member[2], end - member[2])
+    return index
+
+
+def save_index(file_path, signature: List[int], index: MonthIndex) -> MonthIndex:
+    file_path = Path(file_path)
+    index_path = file_path.with_name(file_path.name + INDEX_SUFFIX)
+    with open(index_path, 'w') as indexfile:
+        json.dump({'signature': signature, 'months': index}, indexfile, separators=(',', ':'))
+    return index
+
+
+def read_index(file_path, signature: List[int]) -> Optional[MonthIndex]:
+    file_path = Path(file_path)
+    index_path = file_path.with_name(file_path.name + INDEX_SUFFIX)
+    try:
+        with open(index_path, 'r') as indexfile:
+            stored = json.load(indexfile)
+    except (OSError, ValueError):
+        return None
+    if stored.get('signature') != signature:
+        return None
+    return {year: {month: tuple(offsets) for month, offsets in months.items()}
+            for year, months in stored['months'].items()}
+
+
+class LazyJsonSource:
+    """
+    Reads single months out of the budget file using the persisted month
+    index. A compressed file keeps every month in a gzip member of its own,
+    so a month is read by decompressing just that member. Compressed files
+    written elsewhere (a single member) are never kept in memory, their
+    months are decompressed from the start of the file on every read.
+
+    The months are read from the GUI thread and the job worker, the
+    signature and index of the file are swapped as one snapshot so a
+    reader never mixes the offsets of one file with the bytes of another.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = Path(file_path)
+        # (signature, index, compressed)
+        self._snapshot: Tuple[Optional[List[int]], MonthIndex, bool] = (None, {}, False)
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> MonthIndex:
+        return self._snapshot[1]
+
+    def open(self) -> MonthIndex:
+        with open(self.file_path, 'rb') as jsonfile:
+            return self._refresh(jsonfile)[1]
+
+    def _refresh(self, jsonfile) -> Tuple[List[int], MonthIndex, bool]:
+        signature = _signature(os.fstat(jsonfile.fileno()))
+        with self._lock:
+            if signature != self._snapshot[0]:
+                self._snapshot = self._read_snapshot(jsonfile, signature)
+            return self._snapshot
+
+    def _read_snapshot(self, jsonfile, signature: List[int]) -> Tuple[List[int], MonthIndex, bool]:
+        compressed = jsonfile.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+        index = read_index(self.file_path, signature)
+        if index is None:
+            index = build_index(self.file_path, jsonfile)
+            logger.info(f'indexed {sum(map(len, index.values()))} month(s) of {self.file_path}')
+        return signature, index, compressed
+
+    def load_month(self, year: str, month: str) -> dict:
+        with open(self.file_path, 'rb') as jsonfile:
+            # The compaction may have rewritten the file since it was indexed.
+            # Months that were never materialized have no journaled changes,
+            # so reading them from the new file gives the same content.
+            _, index, compressed = self._refresh(jsonfile)
+            offsets = index[year][month]
+            if len(offsets) == 4:
+                member_start, member_end, start, end = offsets
+                jsonfile.seek(member_start)
+                raw = gzip.decompress(jsonfile.read(member_end - member_start))[start:end]
+            elif compressed:
+                start, end = offsets
+                jsonfile.seek(0)
+                with gzip.GzipFile(fileobj=jsonfile, mode='rb') as gzipfile:
+                    gzipfile.seek(start)
+                    raw = gzipfile.read(end - start)
+            else:
+                start, end = offsets
+                jsonfile.seek(start)
+                raw = jsonfile.read(end - start)
+            return parse_month(json.loads(raw))
+
+
+class _Unloaded:
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<not loaded>'
+
+
+_UNLOADED = _Unloaded()
+
+
+class LazyYear(dict):
+    """
+    Year of the budget behaving like the plain month dict, months are only
+    loaded from the source (anything with load_month(year, month)) the
+    first time they are accessed. A month loaded from two threads at once
+    is only read once, both get the same dict.
+    """
+
+    def __init__(self, source, year: str, months):
+        super().__init__(dict.fromkeys(months, _UNLOADED))
+        self._source = source
+        self._year = year
+        self._lock = threading.Lock()
+
+    def __getitem__(self, month):
+        value = super().__getitem__(month)
+        if value is _UNLOADED:
+            with self._lock:
+                value = super().__getitem__(month)
+                if value is _UNLOADED:
+                    value = self._source.load_month(self._year, month)
+                    super().__setitem__(month, value)
+        return value
+
+    def get(self, month, default=None):
+        if month in self:
+            return self[month]
+        return default
+
+    def setdefault(self, month, default=None):
+        if month not in self:
+            super().__setitem__(month, default)
+        return self[month]
+
+    def pop(self, month, *default):
+        value = super().pop(month, *default)
+        return None if value is _UNLOADED else value
+
+    def __iter__(self):
+        # Overriding it keeps dict(...)/update(...) from copying the raw placeholders.
+        return iter(self.keys())
+
+    def values(self):
+        return [self[month] for month in self]
+
+    def items(self):
+        return [(month, self[month]) for month in self]
+
+    def copy(self):
+        return dict(self.items())
+
+    def loaded_months(self) -> List[str]:
+        return [month for month, value in super().items() if value is not _UNLOADED]
+
+
+def load_lazy(file_path) -> dict:
+    """
+    Opens the budget file without decoding it, every month is
+    materialized on first access
+    """
+    source = LazyJsonSource(file_path)
+    return {year: LazyYear(source, year, months) for year, months in source.open().items()}
+
+
+def fsync_directory(directory) -> None:
+    """
+    Makes a rename in the directory durable, not possible on Windows
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _gzip_members(data: dict):
+    """
+    The compact JSON of the data as gzip members, every month in a member
+    of its own. Yields the member bytes and the range of the month inside
+    the decompressed member, None for the members between the months.
+    """
+    text = '{'
+    for year_number, (year, months) in enumerate(data.items()):
+        text += f'{"," if year_number else ""}{json.dumps(year)}:{{'
+        for month_number, (month, month_data) in enumerate(months.items()):
+            text += f'{"," if month_number else ""}{json.dumps(month)}:'
+            start = len(text.encode())
+            member = (text + json.dumps(month_data, separators=(',', ':'), default=to_json)).encode()
+            # No name or time in the header, the same data gives the same file
+            yield gzip.compress(member, mtime=0), (start, len(member))
+            text = ''
+        text += '}'
+    yield gzip.compress(f'{text}}}'.encode(), mtime=0), None
+
+
+def write_json_atomic(file_path, data: dict, compress: bool = None) -> MonthIndex:
+    """
+    Writes the data next to the destination first and renames it over the
+    original, so a crash mid-write never leaves a truncated budget file.
+    compress writes it as compact gzipped JSON, by default the file
+    keeps the format it has. The month index is saved along with it.
+    """
+    file_path = Path(file_path)
+    if compress is None:
+        compress = is_compressed(file_path)
+    tmp_path = file_path.with_name(f'{file_path.name}.tmp')
+    with open(tmp_path, 'wb') as jsonfile:
+        if compress:
+            index = {year: {} for year in data}
+            months = ((year, month) for year, year_data in data.items() for month in year_data)
+            for member, offsets in _gzip_members(data):
+                if offsets is not None:
+                    year, month = next(months)
+                    index[year][month] = (jsonfile.tell(), jsonfile.tell() + len(member)) + offsets
+                jsonfile.write(member)
+        else:
+            raw = json.dumps(data, indent=4, default=to_json).encode()
+            index = index_months(raw)
+            jsonfile.write(raw)
+        jsonfile.flush()
+        os.fsync(jsonfile.fileno())
+        signature = _signature(os.fstat(jsonfile.fileno()))
+    os.replace(tmp_path, file_path)
+    fsync_directory(file_path.parent)
+    return save_index(file_path, signature, index)
+
+
+def apply_record(data: dict, record: Dict[str, Any]) -> None:
+    """
+    Applies a single journal record to the nested year/month/category/expense dict.
+
+    Records only carry absolute values, so replaying a record twice
+    leaves the data in the same state.
+    """
+    op = record['op']
+    *parents, key = record['path']
+    node = data
+    for part in parents:
+        if part not in node:
+            if op in ('del', 'spending'):
+                return
+            node[part] = {}
+        node = node[part]
+
+    if op == 'set':
+        node[key] = parse_expense(record['value'])
+    elif op == 'merge':
+        month_data = node.setdefault(key, {})
+        for category, category_data in record['value'].items():
+            target = month_data.setdefault(category, {})
+            for expense, expense_data in category_data.items():
+                target[expense] = parse_expense(expense_data)
+    elif op == 'new':
+        if key not in node:
+            node[key] = {}
+    elif op == 'del':
+        node.pop(key, None)
+    elif op == 'spending':
+        if key in node:
+            node[key]["Spending"] = Money.parse(record['value'])
+    else:
+        logger.warning(f'unknown journal record {record}')
+
+
+class BudgetJournal:
+    """
+    Write-ahead journal of the budget mutations.
+
+    Mutations are buffered in memory and appended to a sidecar log on save,
+    which costs the same no matter how many years are stored in the main
+    file. Once the log passes the compaction threshold it is rotated and
+    folded back into the main JSON file on a background thread.
+
+    Synced records (the spending derived from the transactions) are also
+    written ahead of the save, with the group commit of the transaction
+    ledger. They stay in the pending buffer too, so the save writes them
+    again in order with the edits around them.
+    """
+
+    def __init__(self, file_path: str, compact_threshold: int = COMPACT_THRESHOLD):
+        self.file_path = Path(file_path)
+        self.log_path = self.file_path.with_name(self.file_path.name + JOURNAL_SUFFIX)
+        self.compact_threshold = compact_threshold
+        self._pending: List[str] = []
+        self._synced: List[str] = []
+        # _lock guards the pending buffers, _log_lock the log file: new
+        # records don't wait for the fsync of a flush in progress
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+
+    def record(self, op: str, path: Sequence[str], value: Any = None, synced: bool = False) -> None:
+        record = {'op': op, 'path': list(path)}
+        if op in ('set', 'merge', 'spending'):
+            record['value'] = value
+        line = json.dumps(record, separators=(',', ':'), default=to_json)
+        # The flush may be running on the job worker
+        with self._lock:
+            self._pending.append(line)
+            if synced:
+                self._synced.append(line)
+
+    def rotated_logs(self) -> List[Path]:
+        logs = self.file_path.parent.glob(f'{self.log_path.name}.*')
+        return sorted((log for log in logs if log.suffix[1:].isdigit()),
+                      key=lambda log: int(log.suffix[1:]))
+
+    def replay(self, data: dict) -> dict:
+        """
+        Applies the logs left on disk (rotated ones first) on top of the loaded data
+        """
+        for log_path in self.rotated_logs() + [self.log_path]:
+            replay_log(log_path, data)
+        return data
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with self._log_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self._synced = []
+            if not pending:
+                return
+            self._append(pending)
+            size = self.log_path.stat().st_size
+        logger.info(f'journaled {len(pending)} change(s)')
+        if size > self.compact_threshold:
+            self.compact()
+
+    def flush_synced(self) -> None:
+        """
+        Writes the synced records only, called by the transaction ledger when it commits
+        """
+        if not self._synced:
+            return
+        with self._log_lock:
+            with self._lock:
+                synced, self._synced = self._synced, []
+            if synced:
+                self._append(synced)
+
+    def _append(self, lines: List[str]) -> None:
+        with open(self.log_path, 'a') as log:
+            log.write('\n'.join(lines) + '\n')
+            log.flush()
+            os.fsync(log.fileno())
+
+    def compact(self, wait: bool = False) -> None:
+        """
+        Rotates the current log and folds every rotated log into the main file
+        """
+        if self._compactor and self._compactor.is_alive():
+            if wait:
+                self._compactor.join()
+            return
+        with self._log_lock:
+            if self.log_path.exists():
+                self.log_path.rename(self.log_path.with_name(f'{self.log_path.name}.{time.time_ns()}'))
+        self._compactor = threading.Thread(target=self._compact, name='budget-compaction')
+        self._compactor.start()
+        if wait:
+            self._compactor.join()
+
+    def _compact(self) -> None:
+        rotated = self.rotated_logs()
+        if not rotated:
+            return
+        data = read_json(self.file_path)
+        for log_path in rotated:
+            replay_log(log_path, data)
+        write_json_atomic(self.file_path, data)
+        # Only drop the logs once the new main file is in place, a crash
+        # before this point just replays them again on the next start.
+        for log_path in rotated:
+            log_path.unlink()
+        logger.info(f'compacted {len(rotated)} journal(s) into {self.file_path}')
+
+
+def replay_log(log_path: Path, data: dict) -> None:
+    if not log_path.exists():
+        return
+    with open(log_path, 'r') as log:
+        for line in log:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-append can only leave the last line half written.
+                logger.warning(f'skipping torn journal record in {log_path}')
+                continue
+            apply_record(data, record)
+
+
+class BudgetStorage:
+    """
+    Interface of the budget backends, Budget reads and writes its data only through it
+    """
+
+    def load(self) -> dict:
+        """
+        Returns the year -> month -> category -> expense dict the UI works with
+        """
+        raise NotImplementedError
+
+    def add_month(self, year: str, month: str) -> None:
+        raise NotImplementedError
+
+    def set_expense(self, year: str, month: str, category: str, expense: str, expense_data: dict) -> None:
+        raise NotImplementedError
+
+    def merge_month(self, year: str, month: str, month_data: dict) -> None:
+        """
+        Adds or overwrites the given categories/expenses of the month at once
+        """
+        raise NotImplementedError
+
+    def delete(self, year: str, month: str, category: str, expense: str = None) -> None:
+        raise NotImplementedError
+
+    def set_spending(self, year: str, month: str, category: str, expense: str, spending: Money) -> None:
+        """
+        Sets the spending synced from the transactions of the expense, it is
+        committed with the transactions and not on the next save
+        """
+        raise NotImplementedError
+
+    def add_transaction(self, transaction) -> None:
+        pass
+
+    def delete_transaction(self, transaction) -> None:
+        pass
+
+    def add_transactions(self, transactions: Sequence) -> None:
+        for transaction in transactions:
+            self.add_transaction(transaction)
+
+    def load_transactions(self) -> list:
+        return []
+
+    def totals(self, year: str = None, month: str = None) -> Dict[str, Tuple[Money, Money]]:
+        """
+        Allotted and spending summed per category over the matching months
+        """
+        raise NotImplementedError
+
+    def save(self) -> None:
+        raise NotImplementedError
+
+
+class JsonBudgetStorage(BudgetStorage):
+    """
+    The original JSON file, loaded lazily and saved through the journal,
+    transactions go to their own group-committed ledger file
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.journal = BudgetJournal(file_path)
+        self.ledger = LedgerLog(file_path, on_commit=self.journal.flush_synced)
+        self.data = None
+
+    def load(self) -> dict:
+        self.data = self.journal.replay(load_lazy(self.file_path))
+        return self.data
+
+    def add_month(self, year: str, month: str) -> None:
+        self.journal.record('new', (year, month))
+
+    def set_expense(self, year: str, month: str, category: str, expense: str, expense_data: dict) -> None:
+        self.journal.record('set', (year, month, category, expense), expense_data)
+
+    def merge_month(self, year: str, month: str, month_data: dict) -> None:
+        self.journal.record('merge', (year, month), month_data)
+
+    def delete(self, year: str, month: str, category: str, expense: str = None) -> None:
+        path = (year, month, category, expense) if expense else (year, month, category)
+        self.journal.record('del', path)
+
+    def set_spending(self, year: str, month: str, category: str, expense: str, spending: Money) -> None:
+        self.journal.record('spending', (year, month, category, expense), spending, synced=True)
+
+    def add_transaction(self, transaction) -> None:
+        self.ledger.append(transaction)
+
+    def delete_transaction(self, transaction) -> None:
+        self.ledger.remove(transaction)
+
+    def add_transactions(self, transactions: Sequence) -> None:
+        self.ledger.extend(transactions)
+
+    def load_transactions(self) -> list:
+        return self.ledger.load()
+
+    def totals(self, year: str = None, month: str = None) -> Dict[str, Tuple[Money, Money]]:
+        totals = {}
+        for data_year, year_data in self.data.items():
+            if year is not None and data_year != year:
+                continue
+            for data_month, month_data in year_data.items():
+                if month is not None and data_month != month:
+                    continue
+                for category, category_data in month_data.items():
+                    allotted, spending = totals.get(category, (0, 0))
+                    for expense_data in category_data.values():
+                        allotted += Money.parse(expense_data["Allotted"]).cents
+                        spending += Money.parse(expense_data["Spending"]).cents
+                    totals[category] = (allotted, spending)
+        return {category: (Money(allotted), Money(spending)) for category, (allotted, spending) in totals.items()}
+
+    def save(self) -> None:
+        self.journal.flush()
+        self.ledger.flush()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS months (
+    year TEXT NOT NULL,
+    month TEXT NOT NULL,
+    PRIMARY KEY (year, month)
+);
+CREATE TABLE IF NOT EXISTS categories (
+    year TEXT NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (year, month, category)
+);
+CREATE TABLE IF NOT EXISTS expenses (
+    year TEXT NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    expense TEXT NOT NULL,
+    allotted INTEGER NOT NULL DEFAULT 0,
+    spending INTEGER NOT NULL DEFAULT 0,
+    comment TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (year, month, category, expense)
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    year TEXT NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    expense TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    comment TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS transactions_month_category ON transactions (year, month, category);
+"""
+# PRAGMA user_version of the schema above, databases at 0 stored the amounts as REAL units
+SQLITE_SCHEMA_VERSION = 1
+# Amount columns of the tables, converted to cents by the upgrade
+SQLITE_AMOUNT_COLUMNS = {'expenses': ('allotted', 'spending'), 'transactions': ('amount',)}
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+
+class SqliteBudgetStorage(BudgetStorage):
+    """
+    SQLite backend, every month/category/expense is a row keyed on
+    (year, month, category, expense) so point reads and updates don't
+    touch the rest of the budget.
+
+    The edits come from the GUI thread and the commits from the job
+    worker, the connection is shared between them behind a lock.
+    Transactions are group committed like the JSON ledger, every
+    BATCH_SIZE rows or FLUSH_INTERVAL seconds and at exit.
+    """
+
+    def __init__(self, file_path: str, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        self._upgrade()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._uncommitted = 0
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.save)
+
+    def _upgrade(self) -> None:
+        """
+        Creates the schema, databases written before the amounts were
+        stored in cents have their tables rebuilt with the converted amounts
+        """
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        tables = [name for (name,) in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        legacy = [table for table in SQLITE_AMOUNT_COLUMNS if table in tables] if version < 1 else []
+        with self.connection:
+            if legacy:
+                self.connection.execute('DROP INDEX IF EXISTS transactions_month_category')
+            for table in legacy:
+                self.connection.execute(f'ALTER TABLE {table} RENAME TO {table}_units')
+            for statement in SQLITE_SCHEMA.split(';'):
+                self.connection.execute(statement)
+            for table in legacy:
+                columns = [row[1] for row in self.connection.execute(f'PRAGMA table_info({table})')]
+                values = [f'CAST(ROUND({column} * {CENTS}) AS INTEGER)' if column in SQLITE_AMOUNT_COLUMNS[table]
+                          else column for column in columns]
+                self.connection.execute(f'INSERT INTO {table} ({", ".join(columns)}) '
+                                        f'SELECT {", ".join(values)} FROM {table}_units ORDER BY rowid')
+                self.connection.execute(f'DROP TABLE {table}_units')
+            self.connection.execute(f'PRAGMA user_version = {SQLITE_SCHEMA_VERSION}')
+        if legacy:
+            logger.info(f'converted the amounts of {self.file_path} to cents')
+
+    def _execute(self, sql: str, params: Sequence = ()) -> list:
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def load(self) -> dict:
+        data = {}
+        for year, month in self._execute('SELECT year, month FROM months ORDER BY rowid'):
+            data.setdefault(year, []).append(month)
+        return {year: LazyYear(self, year, months) for year, months in data.items()}
+
+    def load_month(self, year: str, month: str) -> dict:
+        month_data = {}
+        for (category,) in self._execute(
+                'SELECT category FROM categories WHERE year = ? AND month = ? ORDER BY rowid', (year, month)):
+            month_data[category] = {}
+        for category, expense, allotted, spending, comment in self._execute(
+                'SELECT category, expense, allotted, spending, comment FROM expenses '
+                'WHERE year = ? AND month = ? ORDER BY rowid', (year, month)):
+            month_data.setdefault(category, {})[expense] = {"Allotted": Money(allotted),
+                                                            "Spending": Money(spending),
+                                                            "Comment": comment}
+        return month_data
+
+    def add_month(self, year: str, month: str) -> None:
+        self._execute('INSERT OR IGNORE INTO months VALUES (?, ?)', (year, month))
+
+    def set_expense(self, year: str, month: str, category: str, expense: str, expense_data: dict) -> None:
+        self.add_month(year, month)
+        self._execute('INSERT OR IGNORE INTO categories VALUES (?, ?, ?)', (year, month, category))
+        self._execute(
+            'INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (year, month, category, expense) DO UPDATE SET '
+            'allotted = excluded.allotted, spending = excluded.spending, comment = excluded.comment',
+            (year, month, category, expense,
+             Money.parse(expense_data["Allotted"]), Money.parse(expense_data["Spending"]),
+             expense_data["Comment"] or ""))
+
+    def merge_month(self, year: str, month: str, month_data: dict) -> None:
+        self.add_month(year, month)
+        with self._lock:
+            self.connection.executemany('INSERT OR IGNORE INTO categories VALUES (?, ?, ?)',
+                                        ((year, month, category) for category in month_data))
+            self.connection.executemany(
+                'INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (year, month, category, expense) DO UPDATE SET '
+                'allotted = excluded.allotted, spending = excluded.spending, comment = excluded.comment',
+                ((year, month, category, expense,
+                  Money.parse(expense_data["Allotted"]), Money.parse(expense_data["Spending"]),
+                  expense_data["Comment"] or "")
+                 for category, category_data in month_data.items()
+                 for expense, expense_data in category_data.items()))
+
+    def delete(self, year: str, month: str, category: str, expense: str = None) -> None:
+        if expense:
+            self._execute('DELETE FROM expenses WHERE year = ? AND month = ? AND category = ? AND expense = ?',
+                          (year, month, category, expense))
+            return
+        self._execute('DELETE FROM expenses WHERE year = ? AND month = ? AND category = ?',
+                      (year, month, category))
+        self._execute('DELETE FROM categories WHERE year = ? AND month = ? AND category = ?',
+                      (year, month, category))
+
+    def set_spending(self, year: str, month: str, category: str, expense: str, spending: Money) -> None:
+        # Only the spending, the rows edited in the view reach the database on save
+        self._execute('UPDATE expenses SET spending = ? WHERE year = ? AND month = ? AND category = ? AND expense = ?',
+                      (Money.parse(spending), year, month, category, expense))
+
+    def add_transaction(self, transaction) -> None:
+        self.add_transactions((transaction,))
+
+    def add_transactions(self, transactions: Sequence) -> None:
+        with self._lock:
+            cursor = self.connection.executemany(
+                'INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((transaction.id, transaction.year, transaction.month, transaction.category,
+                  transaction.expense, Money.parse(transaction.amount), transaction.comment)
+                 for transaction in transactions))
+            self._queue_commit(cursor.rowcount)
+
+    def delete_transaction(self, transaction) -> None:
+        with self._lock:
+            self.connection.execute('DELETE FROM transactions WHERE id = ?', (transaction.id,))
+            self._queue_commit(1)
+
+    def _queue_commit(self, rows: int) -> None:
+        """
+        Commits once BATCH_SIZE transaction rows are pending, or
+        FLUSH_INTERVAL seconds after the first of them
+        """
+        self._uncommitted += rows
+        if self._uncommitted >= self.batch_size:
+            self.save()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.save)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def load_transactions(self) -> list:
+        return [(Money(amount), *row) for amount, *row in self._execute(
+            'SELECT amount, category, expense, comment, id, year, month FROM transactions ORDER BY rowid')]
+
+    def totals(self, year: str = None, month: str = None) -> Dict[str, Tuple[Money, Money]]:
+        query = 'SELECT category, SUM(allotted), SUM(spending) FROM expenses'
+        conditions = []
+        params = []
+        if year is not None:
+            conditions.append('year = ?')
+            params.append(year)
+        if month is not None:
+            conditions.append('month = ?')
+            params.append(month)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' GROUP BY category'
+        return {category: (Money(allotted), Money(spending))
+                for category, allotted, spending in self._execute(query, params)}
+
+    def save(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._uncommitted = 0
+            self.connection.commit()
+
+    def close(self) -> None:
+        self.save()
+        atexit.unregister(self.save)
+        self.connection.close()
+
+
+def open_storage(file_path: str) -> BudgetStorage:
+    """
+    Picks the backend from the extension of the budget file
+    """
+    if Path(file_path).suffix.lower() in SQLITE_SUFFIXES:
+        return SqliteBudgetStorage(file_path)
+    return JsonBudgetStorage(file_path)
+
+
+def convert_json(source_path: str, destination_path: str, compress: bool = None) -> None:
+    """
+    Copies a JSON budget (journal and transactions included) to a new
+    file, compressed when compress or when the new name ends with .gz
+    """
+    destination_path = Path(destination_path)
+    if compress is None:
+        compress = destination_path.suffix.lower() == GZIP_SUFFIX
+    write_json_atomic(destination_path, BudgetJournal(source_path).replay(read_json(source_path)), compress)
+    ledger_path = Path(source_path).with_name(Path(source_path).name + LEDGER_SUFFIX)
+    if ledger_path.exists():
+        shutil.copy(ledger_path, destination_path.with_name(destination_path.name + LEDGER_SUFFIX))
+    logger.info(f'converted {source_path} to {destination_path}')
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str) -> None:
+    """
+    One-shot copy of a JSON budget (journal and transactions included) into a new SQLite database
+    """
+    data = BudgetJournal(json_path).replay(read_json(json_path))
+    storage = SqliteBudgetStorage(db_path)
+    with storage.connection:
+        for year, year_data in data.items():
+            for month, month_data in year_data.items():
+                storage.add_month(year, month)
+                for category, category_data in month_data.items():
+                    storage.connection.execute('INSERT OR IGNORE INTO categories VALUES (?, ?, ?)',
+                                               (year, month, category))
+                    for expense, expense_data in category_data.items():
+                        storage.set_expense(year, month, category, expense, expense_data)
+        storage.connection.executemany(
+            'INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((transaction_id, year, month, category, expense, Money.parse(amount), comment)
+             for amount, category, expense, comment, transaction_id, year, month in LedgerLog(json_path).load()))
+    storage.close()
+    logger.info(f'migrated {json_path} to {db_path}')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Migrate a JSON budget file to SQLite')
+    parser.add_argument('json_path')
+    parser.add_argument('db_path')
+    args = parser.parse_args()
+    migrate_json_to_sqlite(args.json_path, args.db_path)
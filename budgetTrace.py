@@ -0,0 +1,120 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Path of the trace written at exit, tracing is off without it
+TRACE_ENV = 'BUDGET_TRACE'
+# Oldest events are dropped past this many
+MAX_EVENTS = 100000
+
+
+class Tracer:
+    """
+    Timing spans and counters of the hot paths of the budget.
+
+    Spans are always timed, listeners (the status bar overlay) get the
+    name and milliseconds of every finished span. The events themselves
+    are only kept while tracing is enabled, and exported as a Chrome
+    trace (chrome://tracing, ui.perfetto.dev) with one row per thread.
+    """
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.enabled = False
+        self.counters: Dict[str, int] = {}
+        self._events = deque(maxlen=max_events)
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._last: Optional[Tuple[str, float]] = None
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            milliseconds = duration / 1e6
+            self._last = (name, milliseconds)
+            if self.enabled:
+                thread = threading.current_thread()
+                self._threads[thread.ident] = thread.name
+                self._events.append({'name': name, 'ph': 'X', 'ts': (start - self._origin) / 1000,
+                                     'dur': duration / 1000, 'pid': os.getpid(), 'tid': thread.ident,
+                                     'args': args})
+            for listener in self._listeners:
+                listener(name, milliseconds)
+
+    def traced(self, name: str) -> Callable:
+        """
+        Decorator running the function in a span
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            total = self.counters[name] = self.counters.get(name, 0) + value
+        if self.enabled:
+            self._events.append({'name': name, 'ph': 'C', 'ts': self._now_us(), 'pid': os.getpid(),
+                                 'args': {name: total}})
+
+    @property
+    def last(self) -> Optional[Tuple[str, float]]:
+        """
+        (name, milliseconds) of the span that finished last
+        """
+        return self._last
+
+    def add_listener(self, listener: Callable[[str, float], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, float], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def export(self, file_path) -> None:
+        """
+        Writes the events kept so far as a Chrome trace
+        """
+        events = list(self._events)
+        events.extend({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': ident, 'args': {'name': name}}
+                      for ident, name in list(self._threads.items()))
+        with open(file_path, 'w') as tracefile:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, tracefile)
+        logger.info(f'{len(events)} trace event(s) written to {file_path}')
+
+    def trace_to(self, file_path) -> None:
+        """
+        Enables tracing and exports the trace to the file when the process exits
+        """
+        self.enabled = True
+        atexit.register(self.export, file_path)
+
+
+tracer = Tracer()
+span = tracer.span
+count = tracer.count
+traced = tracer.traced
+
+if os.environ.get(TRACE_ENV):
+    tracer.trace_to(os.environ[TRACE_ENV])
@@ -1,21 +1,16 @@
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict
 from functools import partial
-from pprint import pprint
+from typing import Dict, List, Optional, Tuple
 
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
 from PySide2 import QtWidgets, QtGui, QtCore
-from matplotlib import pyplot
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
 
+from budgetJobs import JobListener, JobQueue
+from budgetMoney import Money
+from budgetTrace import count, span, tracer
 
-@dataclass
-class BudgetData:
-    expense: str
-    allotted: float
-    spending: float
-    comment: str
+# Prepared months kept for calendar navigation
+MONTH_VIEW_CACHE_SIZE = 24
 
 
 class BudgetEditorWindow(QtWidgets.QMainWindow):
@@ -26,7 +21,7 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
     budget_added = QtCore.Signal(dict)
     budget_removed = QtCore.Signal(dict)
     budget_updated = QtCore.Signal(dict)
-    add_new_transaction_signal = QtCore.Signal(str, str, str, str)
+    add_new_transaction_signal = QtCore.Signal(str, str, str, str, str, str)
     del_transaction_signal = QtCore.Signal(dict)
     del_row_signal = QtCore.Signal(str, str, str, str)
 
@@ -51,23 +46,24 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
         self.transferBtn = QtWidgets.QPushButton('Transfer From Previous')
         self.transferBtn.clicked.connect(self.transfer_from_previous_month)
 
-        # Create a QTreeWidget
-        self.tree = BudgetTreeWidget(self)
+        self.fill_year_button = QtWidgets.QPushButton('Fill Rest Of Year')
+        self.fill_year_button.clicked.connect(self.fill_rest_of_year)
+
+        # Create the tree view of the month model
+        self.tree = BudgetTreeView(self)
         self.tree.setItemDelegate(BudgetItemDelegate(self.tree))
-        self.tree.setColumnCount(5)
         self.tree.header().setSectionResizeMode(4, QtWidgets.QHeaderView.Stretch)
         self.tree.header().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
         self.tree.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Interactive)
-        self.tree.setHeaderLabels(
-            ['Category', 'Expense', 'Allotted', 'Spending', 'Comment'])
 
         # Connect the itemChanged signal to a slot
         # self.tree.itemChanged.connect(self.set_cell_style)
-        self.figure, self.axes = pyplot.subplots()
 
-        # Create a FigureCanvasQTAgg object to display the figure
-        self.figure_canvas = FigureCanvasQTAgg(self.figure)
-        self.figure.set_facecolor("#AAAAAA")
+        # The chart (and the matplotlib/seaborn/pandas stack behind it) is
+        # only loaded on the first visualize_data, until then an empty
+        # widget holds its place in the layout
+        self.chart = None
+        self.figure_canvas = QtWidgets.QWidget()
 
         # Create a button to save the table data to the loaded json file.
         self.save_button = QtWidgets.QPushButton('Save')
@@ -77,21 +73,30 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
         self.visualize_button = QtWidgets.QPushButton('Visualize graph')
         self.visualize_button.clicked.connect(self.visualize_data)
 
+        self.trend_button = QtWidgets.QPushButton('Trend')
+        self.trend_button.clicked.connect(self.visualize_trend)
+
         self.add_transaction_button = QtWidgets.QPushButton('Add/Edit transaction')
         self.add_transaction_button.clicked.connect(self.show_add_transaction_popup)
 
         self.add_delete_button = QtWidgets.QPushButton('Delete')
         self.add_delete_button.clicked.connect(self.delete_selected_row)
 
+        self.import_button = QtWidgets.QPushButton('Import statement')
+        self.import_button.clicked.connect(self.import_statement)
+        self.importer = None
+
         self.figure_canvas.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
 
         self.category_btn = QtWidgets.QPushButton('Add category')
 
         main_layout = QtWidgets.QHBoxLayout()
+        self.main_layout = main_layout
         layout = QtWidgets.QVBoxLayout()
         dates_layout = QtWidgets.QHBoxLayout()
         dates_layout.addWidget(self.dateEdit)
         dates_layout.addWidget(self.transferBtn)
+        dates_layout.addWidget(self.fill_year_button)
         layout.addLayout(dates_layout)
         layout.addWidget(self.tree)
 
@@ -99,7 +104,9 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
         button_layout.addWidget(self.save_button)
         button_layout.addWidget(self.add_transaction_button)
         button_layout.addWidget(self.add_delete_button)
+        button_layout.addWidget(self.import_button)
         button_layout.addWidget(self.visualize_button)
+        button_layout.addWidget(self.trend_button)
         layout.addLayout(button_layout)
 
         main_layout.addLayout(layout)
@@ -108,6 +115,9 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
         widget = QtWidgets.QWidget()
         widget.setLayout(main_layout)
         self.setCentralWidget(widget)
+        # Created up front, showing it on the first job message would
+        # resize the chart canvas and make it redraw
+        self.setStatusBar(QtWidgets.QStatusBar(self))
 
         # Visualize current month as soon as the app loads.
         # self.visualize_button.click()
@@ -132,10 +142,46 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
 
         self.budget = budget
 
+        # Saving and aggregating run on a worker thread, their results
+        # come back to the GUI thread through these signals
+        self.job_signals = JobSignals(self)
+        self.job_signals.started.connect(self.on_job_started)
+        self.job_signals.finished.connect(self.on_job_finished)
+        self.job_signals.failed.connect(self.on_job_failed)
+        self.jobs = JobQueue(self.job_signals)
+        self.month_views = MonthViewCache(budget)
+
+        # Edits made in the view change the budget data in place.
+        model = self.tree.model()
+        model.dataChanged.connect(self.on_month_edited)
+        model.rowsInserted.connect(self.on_month_edited)
+        model.rowsRemoved.connect(self.on_month_edited)
+
+        # Signal emissions are counted in the trace
+        for name, signal in [('add_new_transaction', self.add_new_transaction_signal),
+                             ('del_transaction', self.del_transaction_signal),
+                             ('del_row', self.del_row_signal),
+                             ('dataChanged', model.dataChanged)]:
+            signal.connect(lambda *args, name=name: count(f'signal {name}'))
+
+        # Cost of the last traced operation, toggled with F12. Spans
+        # finish on the job worker too, the signal brings them to the GUI thread
+        self.trace_signals = TraceSignals(self)
+        self.trace_signals.span_finished.connect(self.on_span_finished)
+        tracer.add_listener(self.trace_signals.span_finished.emit)
+        self.trace_label = QtWidgets.QLabel()
+        self.statusBar().addPermanentWidget(self.trace_label)
+        self.trace_label.setVisible(settings.value("traceOverlay", False, type=bool))
+        QtWidgets.QShortcut(QtGui.QKeySequence(QtCore.Qt.Key_F12), self, self.toggle_trace_overlay)
+
         # Signals for budget logic.
         self.combo_category = None
         self.combo_subcategory = None
 
+        # The model needs a month before the first calendar change, the
+        # popups add rows to the month shown
+        self.on_calendar_selection_changed()
+
         #self.add_new_transaction_signal.connect(self.tree_update_spending)
         '''
         self.budget_added.connect(self.budget.add_budget)
@@ -143,12 +189,8 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
         self.budget_updated.connect(self.budget.update_budget)
         '''
 
-    def get_data_for_date(self,
-                          input_year: str,
-                          input_month: str,
-                          disable_spending: bool = False,
-                          disable_comment: bool = False) -> None:
-        """ Populates the tree widget with data from the json file.
+    def get_data_for_date(self, input_year: str, input_month: str) -> None:
+        """ Points the tree model at the month of the budget data.
 
         :Example:
 
@@ -166,107 +208,90 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
         ...}
         """
 
-        self.tree.clear()
-
-        if self.budget.data.get(input_year) is None:
-            return None
-        if self.budget.data.get(input_year).get(input_month) is None:
-            return None
+        with span('populate tree', year=input_year, month=input_month):
+            view = self.month_views.get(input_year, input_month)
+            self.tree.model().set_nodes(input_year, input_month, view.nodes)
 
-        for category, category_data in self.budget.data[input_year][input_month].items():
-            category_item = BudgetCategoryItem(self.tree)
-            category_item.setText(0, category)
-            for expense, expenseData in category_data.items():
-                if disable_spending:
-                    expenseData["Spending"] = 0
-                if disable_comment:
-                    expenseData["Comment"] = ""
-                BudgetItem(category_item,
-                           expense,
-                           round(float(expenseData["Allotted"]), 2),
-                           round(float(expenseData["Spending"]), 2),
-                           expenseData["Comment"],
-                           )
+        # Warm the months the calendar most likely goes to next
+        date = QtCore.QDate.fromString(f'{input_month} {input_year}', 'MMMM yyyy')
+        if date.isValid():
+            adjacent = [(other.toString("yyyy"), other.toString("MMMM"))
+                        for other in (date.addMonths(-1), date.addMonths(1))]
+            self.month_views.want(adjacent)
+            self.jobs.submit('prefetch', self.month_views.prefetch, coalesce=True)
 
     def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         settings = QtCore.QSettings("EP", "BudgetApp")
         settings.setValue("windowGeometry", self.saveGeometry())
         settings.setValue("windowState", self.saveState())
+        settings.setValue("traceOverlay", self.trace_label.isVisible())
+        # Let the queued saves finish
+        self.jobs.shutdown()
+        tracer.remove_listener(self.trace_signals.span_finished.emit)
         super().closeEvent(event)
 
+    def toggle_trace_overlay(self) -> None:
+        self.trace_label.setVisible(not self.trace_label.isVisible())
+
+    def on_span_finished(self, name: str, milliseconds: float) -> None:
+        if self.trace_label.isVisible():
+            self.trace_label.setText(f'{name}: {milliseconds:.1f} ms')
+
     def on_calendar_selection_changed(self):
-        print(self.sender())
         # Update the table data when the calendar selection changes
-        print(f'month : {self.dateEdit.calendarWidget().selectedDate().toString("yyyy")}')
-        print(f'month : {self.dateEdit.calendarWidget().selectedDate().toString("MMMM")}')
         self.get_data_for_date(self.dateEdit.calendarWidget().selectedDate().toString("yyyy"),
                                self.dateEdit.calendarWidget().selectedDate().toString("MMMM"))
         # self.set_table_data()
 
+    def on_month_edited(self, *args):
+        model = self.tree.model()
+        if model.month_key is not None:
+            self.budget.touch(*model.month_key)
+            # The model keeps the shown view in step with its edits
+            self.month_views.stamp(*model.month_key, model.nodes)
+
     def transfer_from_previous_month(self):
         current_date = self.dateEdit.calendarWidget().selectedDate()
-
         previous_month_date = current_date.addMonths(-1)
-        self.get_data_for_date(previous_month_date.toString("yyyy"),
-                               previous_month_date.toString("MMMM"),
-                               disable_spending=True)
+        self.roll_forward(previous_month_date, [current_date])
+
+    def fill_rest_of_year(self):
+        current_date = self.dateEdit.calendarWidget().selectedDate()
+        self.roll_forward(current_date, [current_date.addMonths(months)
+                                         for months in range(1, 13 - current_date.month())])
+
+    def roll_forward(self, source_date: QtCore.QDate, target_dates: List[QtCore.QDate]) -> None:
+        """
+        Copies the expenses of the source month into the target months,
+        without their spending and keeping what the targets already have
+        """
+        source = (source_date.toString("yyyy"), source_date.toString("MMMM"))
+        if source[1] not in self.budget.data.get(source[0], {}):
+            self.statusBar().showMessage(f'Nothing to copy from {source[1]} {source[0]}', 2000)
+            return
+        # Pending edits of the shown month go first, they are not overwritten
+        self.budget.apply_changes(self.tree.model().take_changes())
+        copied = self.budget.roll_forward(source, [(date.toString("yyyy"), date.toString("MMMM"))
+                                                   for date in target_dates])
+        self.statusBar().showMessage(f'{copied} expense(s) copied from {source[1]} {source[0]}', 2000)
+        selected_date = self.dateEdit.calendarWidget().selectedDate()
+        self.get_data_for_date(selected_date.toString("yyyy"), selected_date.toString("MMMM"))
+        self.jobs.submit('save', self.budget.save, coalesce=True)
 
     def save_tree_data(self):
 
         # Get the selected month from the calendar widget
         selected_year = self.dateEdit.calendarWidget().selectedDate().toString("yyyy")
         selected_month = self.dateEdit.calendarWidget().selectedDate().toString("MMMM")
-        # Iterate over the tree and save the data
-        selected_month_data = {}
+        model = self.tree.model()
 
-        try:
-            original_month_data = self.budget.data[selected_year][selected_month]
-            selected_month_data = original_month_data
-        except KeyError as e:
-            print("Nothing to save")
-
-        iter_data = {key: value for key, value in original_month_data.items()
-                     if not self.tree.find_category_item(key)}
-        for key in iter_data.keys():
-            self.del_row_signal.emit(selected_year,
-                                     selected_month,
-                                     key,
-                                     "")
-
-        iter_data_exp = {(key, key1) for key, value in original_month_data.items()
-                         for key1 in value.keys()
-                         if not self.tree.find_expense_item(key, key1)}
-        for key, key1 in iter_data_exp:
-            if not self.tree.find_expense_item(key, key1):
-                self.del_row_signal.emit(selected_year,
-                                         selected_month,
-                                         key,
-                                         key1)
-
-        # items = self.tree.findItems("", QtCore.Qt.MatchContains) if parent is None else parent.takeChildren()
-        for i in range(self.tree.topLevelItemCount()):
-            category_item = self.tree.topLevelItem(i)
-            for j in range(category_item.childCount()):
-                category_name = category_item.text(0)
-                expense_item = category_item.child(j)
-                expense = expense_item.text(1)
-                allotted = expense_item.text(2)
-                spending = expense_item.text(3)
-                comment = expense_item.text(4)
-                category_update = {
-                    expense: {
-                        "Allotted": allotted,
-                        "Spending": spending,
-                        "Comment": comment
-                    }
-                }
-                if category_name in selected_month_data:
-                    selected_month_data[category_name].update(category_update)
-                else:
-                    selected_month_data[category_name] = category_update
-
-        self.budget.data[selected_year][selected_month] = selected_month_data
-        self.budget.save()
+        # Deleted rows already reached the budget through del_row_signal,
+        # only the edited and inserted rows are left to hand over
+        self.budget.apply_changes(model.take_changes())
+        self.jobs.submit('save', self.budget.save, coalesce=True)
+
+        if model.month_key != (selected_year, selected_month):
+            self.get_data_for_date(selected_year, selected_month)
 
     def show_add_transaction_popup(self):
         popup = AddTransactionPopup(self, self.budget, self.dateEdit.calendarWidget().selectedDate().toString("yyyy"),
@@ -277,82 +302,128 @@ class BudgetEditorWindow(QtWidgets.QMainWindow):
         selectedYear = self.dateEdit.calendarWidget().selectedDate().toString('yyyy')
         selectedMonth = self.dateEdit.calendarWidget().selectedDate().toString('MMMM')
 
-        # Filter the data to only include the selected month
-        data = self.budget.data.get(selectedYear).get(selectedMonth)
-        if data is None:
-            return
+        version = self.budget.month_version(selectedYear, selectedMonth)
+        self.jobs.submit('aggregate', self.aggregate_month, selectedYear, selectedMonth, version)
 
-        # Extract the category, expense, and spending data from the JSON data
-        categories = []
-        allotted = {}
-        spending = {}
-        amounts = []
-        types = []
-        overall = {}
-        overall.update({"Allotted": 0.0, "Spending": 0.0})
-
-        for category, subdict in data.items():
-            categories.append(category)
-            allotted.update({category: 0.0})
-            spending.update({category: 0.0})
-            for subcategory, values in subdict.items():
-                # expenses.append(subcategory)
-                allotted[category] += float(values['Allotted'])
-                # amounts.append(float(values['Allotted']))
-                # types.append('Allotted')
-                # expenses.append(subcategory)
-                spending[category] += float(values['Spending'])
-                # amounts.append(float(values['Spending']))
-                # types.append('Spending')
-            amounts.append(allotted[category])
-            overall["Allotted"] += allotted[category]
-            types.append('Allotted')
-            amounts.append(spending[category])
-            overall["Spending"] += spending[category]
-            types.append("Spending")
-            categories.append(category)
-        categories.append("Overall")
-        categories.append("Overall")
-        amounts.append(overall["Allotted"])
-        types.append('Allotted')
-        amounts.append(overall["Spending"])
-        types.append('Spending')
-
-        # Create a dataframe with the data
-        data = pd.DataFrame({'expenses': categories, 'amounts': amounts, 'types': types})
-
-        # Set the theme of the plot
-        sns.set_theme(style="whitegrid", palette="pastel", font_scale=1.2, color_codes=True)
-
-        # Create a bar chart with seaborn
-        self.axes.clear()
-        ax = sns.barplot(x="amounts", y="expenses", hue="types", data=data, ax=self.axes)
-        self.axes.set_title(f'{selectedMonth} Budget')
-        self.axes.set_xlabel('Amount')
-        self.axes.set_ylabel('Expense')
-
-        # Remove the top and right spines
-        sns.despine(offset=10)
-
-        # Adjust the spacing and padding
-        plt.tight_layout(pad=2.5)
-
-        # Add labels and numbers to the barplot
-        for container in ax.containers:
-            ax.bar_label(container, fmt='%.2f')
-
-        # Update the graph on the FigureCanvasQTAgg object
-        self.figure_canvas.draw()
+    def visualize_trend(self):
+        self.jobs.submit('trend', self.budget.reports.monthly)
+
+    def aggregate_month(self, year: str, month: str, version: int):
+        """
+        Allotted and spending per category of the month, runs on the job worker
+        """
+        with span('aggregate', year=year, month=month):
+            totals = self.budget.aggregates.by_category(year, month)
+            if not totals.empty:
+                totals.loc["Overall"] = totals.sum()
+        return year, month, version, totals
+
+    def on_job_started(self, name: str) -> None:
+        if name == 'save':
+            self.statusBar().showMessage('Saving...')
+
+    def on_job_finished(self, name: str, result) -> None:
+        if name == 'save':
+            self.statusBar().showMessage('Saved', 2000)
+        elif name == 'aggregate':
+            year, month, version, totals = result
+            if not totals.empty:
+                self.ensure_chart().show(year, month, version, totals)
+        elif name == 'trend':
+            if not result.empty:
+                self.ensure_chart().show_trend(result)
+
+    def on_job_failed(self, name: str, error: str) -> None:
+        self.statusBar().showMessage(f'{name} failed: {error}')
+
+    def ensure_chart(self) -> "BudgetChart":
+        """
+        Loads the plotting module and swaps the chart canvas in for the placeholder
+        """
+        if self.chart is None:
+            from budgetChart import BudgetChart
+
+            self.chart = BudgetChart()
+            canvas = self.chart.canvas
+            canvas.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+            canvas.setGeometry(self.figure_canvas.geometry())
+            self.main_layout.replaceWidget(self.figure_canvas, canvas)
+            self.figure_canvas.deleteLater()
+            self.figure_canvas = canvas
+        return self.chart
 
     def tree_update_spending(self, month_data):
         self.tree.update_expense_spending(month_data)
 
+    def refresh_expense_spending(self, year: str, month: str, category: str, expense: str) -> None:
+        """
+        Shows the running spending total of the expense kept by the budget
+        """
+        if self.tree.model().month_key == (year, month):
+            self.tree.update_expense_spending(
+                {category: {expense: self.budget.spending_total(year, month, category, expense)}})
+
+    def import_statement(self):
+        """
+        Imports a CSV/OFX bank statement one batch per event loop
+        iteration, so the window keeps responding during big imports
+        """
+        file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Select bank statement', '',
+                                                             'Statements (*.csv *.ofx *.qfx)')
+        if not file_path:
+            return
+        from budgetImport import StatementImporter, read_statement
+
+        self.importer = StatementImporter(self.budget, read_statement(file_path), self.budget.categorizer)
+        self.import_button.setEnabled(False)
+        QtCore.QTimer.singleShot(0, self.import_next_batch)
+
+    def import_next_batch(self):
+        importer = self.importer
+        if importer.step():
+            self.statusBar().showMessage(f'Imported {importer.imported} transaction(s)...')
+            QtCore.QTimer.singleShot(0, self.import_next_batch)
+            return
+        self.statusBar().showMessage(f'Imported {importer.imported} transaction(s), '
+                                     f'{importer.duplicates} already in the budget, {importer.skipped} skipped')
+        self.importer = None
+        self.import_button.setEnabled(True)
+        # The spending of the shown month may have changed
+        month_key = self.tree.model().month_key
+        if month_key is not None:
+            self.get_data_for_date(*month_key)
+
     def delete_selected_row(self):
         selected_year = self.dateEdit.calendarWidget().selectedDate().toString("yyyy")
         selected_month = self.dateEdit.calendarWidget().selectedDate().toString("MMMM")
         self.tree.remove_currently_selected(selected_year, selected_month)
 
 
+class JobSignals(QtCore.QObject, JobListener):
+    """
+    Emits the job events of the worker thread, the connected slots run on the GUI thread
+    """
+    started = QtCore.Signal(str)
+    finished = QtCore.Signal(str, object)
+    failed = QtCore.Signal(str, str)
+
+    def job_started(self, name: str) -> None:
+        self.started.emit(name)
+
+    def job_finished(self, name: str, result) -> None:
+        self.finished.emit(name, result)
+
+    def job_failed(self, name: str, error: Exception) -> None:
+        self.failed.emit(name, str(error))
+
+
+class TraceSignals(QtCore.QObject):
+    """
+    Forwards the finished spans of any thread to the GUI thread
+    """
+    span_finished = QtCore.Signal(str, float)
+
+
 class AddTransactionPopup(QtWidgets.QDialog):
     category_popup_closed = QtCore.Signal(str, str)
 
@@ -367,17 +438,8 @@ class AddTransactionPopup(QtWidgets.QDialog):
 
         self.timer = QtCore.QTimer(self)
 
-        try:
-            self.year_data = self.budget.data[year]
-        except KeyError:
-            self.budget.data[year] = {}
-            self.year_data = self.budget.data[year]
-
-        try:
-            self.month_data = self.budget.data[year][month]
-        except KeyError:
-            self.budget.data[year][month] = {}
-            self.month_data = self.budget.data[year][month]
+        self.month_data = self.budget.add_new_month(year, month)
+        self.year_data = self.budget.data[year]
 
         self.combo_category = QtWidgets.QComboBox(self)
         self.combo_category.addItems(self.month_data)
@@ -392,11 +454,12 @@ class AddTransactionPopup(QtWidgets.QDialog):
         self.combo_category.setCurrentIndex(1)
         self.category_popup_closed.connect(self.select_new_categories)
 
-        transaction_amount = QtWidgets.QLineEdit(self)
-        transaction_amount.setPlaceholderText("Enter amount")
+        self.transaction_amount = QtWidgets.QLineEdit(self)
+        self.transaction_amount.setPlaceholderText("Enter amount")
 
         transaction_comment = QtWidgets.QLineEdit(self)
         transaction_comment.setPlaceholderText("Description...")
+        transaction_comment.editingFinished.connect(lambda: self.suggest_expense(transaction_comment.text()))
 
         self.transactions_tree = QtWidgets.QTreeWidget()
         self.transactions_tree.setColumnCount(4)
@@ -405,7 +468,7 @@ class AddTransactionPopup(QtWidgets.QDialog):
         add_button = QtWidgets.QPushButton("Add", self)
         add_button.clicked.connect(lambda: self.add_transaction(self.combo_category.currentText(),
                                                                 self.combo_subcategory.currentText(),
-                                                                transaction_amount.text(),
+                                                                self.transaction_amount.text(),
                                                                 transaction_comment.text()))
 
         delete_button = QtWidgets.QPushButton("Delete selected", self)
@@ -414,17 +477,21 @@ class AddTransactionPopup(QtWidgets.QDialog):
         self.update_button = QtWidgets.QPushButton("Update budget", self)
         self.update_button.clicked.connect(self.update_budget_with_transactions)
 
+        self.categorize_button = QtWidgets.QPushButton("Categorize imported", self)
+        self.categorize_button.clicked.connect(self.categorize_imported)
+
         main_layout = QtWidgets.QVBoxLayout()
         input_layout = QtWidgets.QHBoxLayout()
         tree_layout = QtWidgets.QVBoxLayout()
         input_layout.addWidget(self.combo_category)
         input_layout.addWidget(self.combo_subcategory)
-        input_layout.addWidget(transaction_amount)
+        input_layout.addWidget(self.transaction_amount)
         input_layout.addWidget(transaction_comment)
         input_layout.addWidget(add_button)
         input_layout.addWidget(delete_button)
         tree_layout.addWidget(self.transactions_tree)
         tree_layout.addWidget(self.update_button)
+        tree_layout.addWidget(self.categorize_button)
         main_layout.addLayout(input_layout)
         main_layout.addLayout(tree_layout)
 
@@ -457,18 +524,29 @@ class AddTransactionPopup(QtWidgets.QDialog):
 
     def add_transaction(self, category, expense, amount, comment):
         # Create a new QTreeWidgetItem with the data values
-        item = QtWidgets.QTreeWidgetItem([category, expense, str(amount), comment])
+        try:
+            amount = Money.parse(amount)
+        except ValueError:
+            style = self.transaction_amount.styleSheet()
+            self.transaction_amount.setStyleSheet(StyleManager.red_frame_style)
+            self.timer.singleShot(1000, lambda: AddNewCategoryPopup.back_to_style(self.transaction_amount,
+                                                                                  style, amount))
+            return
         if expense == "":
-            print("Choose expense")
+            self.parent().statusBar().showMessage('Choose an expense for the transaction', 2000)
+            return
+        item = QtWidgets.QTreeWidgetItem([category, expense, str(amount), comment])
         # Add the item to the tree widget
         self.transactions_tree.addTopLevelItem(item)
         # TODO: add transaction to budget_transactions
         self.parent().add_new_transaction_signal.emit(category,
                                                       expense,
                                                       str(amount),
-                                                      comment)
+                                                      comment,
+                                                      self.year,
+                                                      self.month)
         item.setData(0, QtCore.Qt.UserRole, "placeholder")
-        #self.budget.transactions.add_new_transaction(category, expense, str(amount), comment)
+        self.parent().refresh_expense_spending(self.year, self.month, category, expense)
 
     def delete_transaction(self):
         transaction_item = self.transactions_tree.currentItem()
@@ -476,11 +554,12 @@ class AddTransactionPopup(QtWidgets.QDialog):
         data = transaction_item.data(0, QtCore.Qt.UserRole)
         if data == "placeholder":
             # the budget has to be updated before any transaction can be deleted
-            print("Update the budget")
+            self.parent().statusBar().showMessage('Reopen the transactions to delete the ones just added', 2000)
             return
         else:
             self.transactions_tree.takeTopLevelItem(transaction_index)
             self.parent().del_transaction_signal.emit(data)
+            self.parent().refresh_expense_spending(self.year, self.month, data["category"], data["expense"])
 
     def populate_subcategories(self):
         #TODO : also clear the comboboxes if categories were deleted
@@ -498,14 +577,16 @@ class AddTransactionPopup(QtWidgets.QDialog):
 
     def populate_rows(self):
         self.transactions_tree.clear()
-        for row, transaction in enumerate(self.budget.transactions):
+        for row, transaction in enumerate(self.budget.transactions.for_month(self.year, self.month)):
             item = QtWidgets.QTreeWidgetItem(
-                [transaction.category, transaction.expense, str(float(transaction.amount)), transaction.comment])
+                [transaction.category, transaction.expense, str(transaction.amount), transaction.comment])
             data = {"id": transaction.id,
                     "category": transaction.category,
                     "expense": transaction.expense,
-                    "amount": transaction.amount,
-                    "comment": transaction.comment}
+                    "amount": str(transaction.amount),
+                    "comment": transaction.comment,
+                    "year": transaction.year,
+                    "month": transaction.month}
             self.transactions_tree.addTopLevelItem(item)
 
             item.setData(0, QtCore.Qt.UserRole, data)
@@ -516,33 +597,35 @@ class AddTransactionPopup(QtWidgets.QDialog):
             #item.setText(3, item.text(4))
 
     def update_budget_with_transactions(self):
-        #updated_spending = float(0)
-        updated_spending = {}
-        for row in range(self.transactions_tree.topLevelItemCount()):
-            category = self.transactions_tree.topLevelItem(row).text(0)
-            updated_spending.update({category: {}})
-
-        for row in range(self.transactions_tree.topLevelItemCount()):
-            category = self.transactions_tree.topLevelItem(row).text(0)
-            expense = self.transactions_tree.topLevelItem(row).text(1)
-            for row1 in range(self.transactions_tree.topLevelItemCount()):
-                expense = self.transactions_tree.topLevelItem(row).text(1)
-                if self.transactions_tree.topLevelItem(row).text(0) == category:
-                    updated_spending[category].update({expense: float(0)})
-
-        for row in range(self.transactions_tree.topLevelItemCount()):
-            category = self.transactions_tree.topLevelItem(row).text(0)
-            expense = self.transactions_tree.topLevelItem(row).text(1)
-            amount = self.transactions_tree.topLevelItem(row).text(2)
-            comment = self.transactions_tree.topLevelItem(row).text(3)
-            row_data = self.transactions_tree.topLevelItem(row).data(0, QtCore.Qt.UserRole)
-            updated_spending[category][expense] += float(amount)
-            #     # TODO put this on logic module instead.
-
-        self.month_data[category][expense].update({"Spending": updated_spending[category][expense]})
+        updated_spending = self.budget.update_spending_from_transactions(self.year, self.month)
         self.parent().tree_update_spending(updated_spending)
         self.populate_rows()
 
+    def suggest_expense(self, comment: str) -> None:
+        """
+        Selects the category and expense the categorizer suggests for the
+        description, when they exist in the month
+        """
+        suggestion = self.budget.categorizer.match(comment)
+        if suggestion is None:
+            return
+        category, expense = suggestion
+        if expense not in self.month_data.get(category, {}):
+            return
+        self.combo_category.setCurrentIndex(self.combo_category.findText(category, QtCore.Qt.MatchFlag.MatchExactly))
+        self.combo_subcategory.clear()
+        self.combo_subcategory.addItems(self.month_data[category])
+        self.combo_subcategory.insertItem(0, "Add/Edit...")
+        self.combo_subcategory.setCurrentIndex(self.combo_subcategory.findText(expense,
+                                                                               QtCore.Qt.MatchFlag.MatchExactly))
+
+    def categorize_imported(self):
+        from budgetImport import DEFAULT_EXPENSE
+
+        moved = self.budget.recategorize(*DEFAULT_EXPENSE)
+        self.parent().statusBar().showMessage(f'{moved} transaction(s) categorized', 2000)
+        self.update_budget_with_transactions()
+
 
 class AddNewCategoryPopup(QtWidgets.QDialog):
     def __init__(self, parent, category: str = None):
@@ -608,7 +691,7 @@ class AddNewCategoryPopup(QtWidgets.QDialog):
                                                                    style, allotted))
             return
         try:
-            float(allotted)
+            allotted = Money.parse(allotted)
         except ValueError:
             self.allotted_amount_line_edit.setStyleSheet(StyleManager.red_frame_style)
             self.timer.singleShot(1000, lambda: self.back_to_style(self.allotted_amount_line_edit,
@@ -617,12 +700,8 @@ class AddNewCategoryPopup(QtWidgets.QDialog):
 
         # This part of the code checks if we already have the category created
         # if we don't it will create a new
-        tree: QtWidgets.QTreeWidget = self.parent().parent().tree
-
-        category_item = tree.find_category_item(category)
-        if category_item is None:
-            category_item = BudgetCategoryItem(tree)
-            category_item.setText(0, category)
+        tree: BudgetTreeView = self.parent().parent().tree
+        model: BudgetMonthModel = tree.model()
 
         if comment is None:
             comment = ""
@@ -630,8 +709,7 @@ class AddNewCategoryPopup(QtWidgets.QDialog):
         # This part of the code checks if such expense item already exists
         # if it does not it creates the expense if it does it updates
         # allotted and comment
-        expense_item = tree.find_expense_item(category, expense)
-        if expense_item:
+        if model.has_expense(category, expense):
             original_text = self.expense_name_line_edit.text()
             style_expense = StyleManager.get_temp_text_style("Exists")
             self.expense_name_line_edit.setStyleSheet(style_expense)
@@ -640,18 +718,19 @@ class AddNewCategoryPopup(QtWidgets.QDialog):
             style_allotted = StyleManager.get_temp_text_style("Updated")
             self.allotted_amount_line_edit.setStyleSheet(style_allotted)
             self.timer.singleShot(800, lambda: self.back_to_style(self.allotted_amount_line_edit,
-                                                                  style, allotted))
+                                                                  style, str(allotted)))
             self.comment_line_edit.setStyleSheet(style_allotted)
-            expense_item.setText(2, allotted)
+            model.set_value(category, expense, "Allotted", allotted)
             self.timer.singleShot(800, lambda: self.back_to_style(self.comment_line_edit,
                                                                   style, comment))
-            expense_item.setText(4, comment)
+            model.set_value(category, expense, "Comment", comment)
             return
         else:
-            expense_item = BudgetItem(category_item, expense, float(allotted), 0.0, comment)
-            self.budget.add_new_category(self.parent().year, self.parent().month,
-                                         category, expense, float(allotted), comment)
-            tree.expandItem(category_item)
+            year, month = self.parent().year, self.parent().month
+            self.budget.add_new_category(year, month,
+                                         category, expense, allotted, comment)
+            model.insert_expense(category, expense, self.budget.data[year][month][category][expense])
+            tree.expand(model.category_index(category))
             self.parent().category_popup_closed.emit(category, expense)
             self.close()
 
@@ -667,31 +746,342 @@ class AddNewCategoryPopup(QtWidgets.QDialog):
     #     self.parent().category_popup_closed.emit(category, expense)
 
 
-class BudgetCategoryItem(QtWidgets.QTreeWidgetItem):
-    def __init__(self, parent=None):
-        super().__init__(parent)
+class _CategoryNode:
+    """
+    Category row of the BudgetMonthModel, holds references to the
+    expense dicts of Budget.data so edits land in place
+    """
+    __slots__ = ('name', 'row', 'expenses', 'data', 'over')
 
+    def __init__(self, name: str, category_data: dict, row: int = 0):
+        self.name = name
+        # Position among the categories, set by the model when it shows the node
+        self.row = row
+        self.expenses: List[str] = list(category_data)
+        self.data: Dict[str, dict] = dict(category_data)
+        # Whether each expense spent more than allotted, kept up to date
+        # by the model so painting never compares amounts
+        self.over: Dict[str, bool] = {expense: over_budget(expense_data)
+                                      for expense, expense_data in category_data.items()}
 
-class BudgetItem(QtWidgets.QTreeWidgetItem):
+
+def over_budget(expense_data: dict) -> bool:
+    return Money.parse(expense_data["Spending"]) > Money.parse(expense_data["Allotted"])
+
+
+def month_nodes(month_data: Optional[dict]) -> List[_CategoryNode]:
+    nodes = [_CategoryNode(category, category_data) for category, category_data in (month_data or {}).items()]
+    count('category rows', len(nodes))
+    count('expense rows', sum(len(node.expenses) for node in nodes))
+    return nodes
+
+
+class MonthView:
     """
-    Class to the set QTreeWidgetItem object for the new expense added by user
+    Rows of a month ready for the model, with the version of the month they were built from
     """
+    __slots__ = ('version', 'nodes')
 
-    def __init__(self, parent, expense: str, allotted: float, spending: float, comment: str):
-        super().__init__(parent)
+    def __init__(self, version: int, nodes: List[_CategoryNode]):
+        self.version = version
+        self.nodes = nodes
+
+
+class MonthViewCache:
+    """
+    Least recently used month views of the budget.
+
+    Going back to a month reuses its rows and over budget flags as long
+    as the budget didn't bump the version of the month since. prefetch
+    builds views off the GUI thread, the months next to the shown one
+    are then ready before the calendar gets there. Only the months last
+    passed to want are prefetched, a prefetch still queued picks up the
+    months of the calendar's latest position.
+    """
+
+    def __init__(self, budget, size: int = MONTH_VIEW_CACHE_SIZE):
+        self.budget = budget
+        self.size = size
+        self._views: "OrderedDict[Tuple[str, str], MonthView]" = OrderedDict()
+        self._wanted: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def _cached(self, year: str, month: str) -> Optional[MonthView]:
+        view = self._views.get((year, month))
+        if view is None or view.version != self.budget.month_version(year, month):
+            return None
+        self._views.move_to_end((year, month))
+        return view
+
+    def _build(self, year: str, month: str) -> MonthView:
+        # Taken first, a change made while building makes the view stale
+        version = self.budget.month_version(year, month)
+        view = MonthView(version, month_nodes(self.budget.data.get(year, {}).get(month)))
+        count('month views built')
+        with self._lock:
+            self._views[(year, month)] = view
+            self._views.move_to_end((year, month))
+            while len(self._views) > self.size:
+                self._views.popitem(last=False)
+        return view
+
+    def get(self, year: str, month: str) -> MonthView:
+        with self._lock:
+            view = self._cached(year, month)
+        if view is not None:
+            count('month view hits')
+            return view
+        return self._build(year, month)
+
+    def want(self, months: List[Tuple[str, str]]) -> None:
+        """
+        Sets the months the next prefetch builds, replacing the ones not prefetched yet
+        """
+        with self._lock:
+            self._wanted = list(months)
+
+    def prefetch(self) -> None:
+        """
+        Builds the views of the wanted months that are not cached yet, runs on the job worker
+        """
+        with self._lock:
+            months, self._wanted = self._wanted, []
+        for year, month in months:
+            with self._lock:
+                view = self._cached(year, month)
+            if view is None and month in self.budget.data.get(year, {}):
+                try:
+                    self._build(year, month)
+                except RuntimeError:
+                    # The GUI changed the month while it was read, it is built when shown
+                    continue
+
+    def stamp(self, year: str, month: str, nodes: List[_CategoryNode]) -> None:
+        """
+        Marks the view as current again after the model edited these nodes
+        """
+        with self._lock:
+            view = self._views.get((year, month))
+            if view is not None and view.nodes is nodes:
+                view.version = self.budget.month_version(year, month)
+
+
+class BudgetMonthModel(QtCore.QAbstractItemModel):
+    """
+    Exposes one month of Budget.data to the tree view without copying it:
+    categories are the top level rows, their expenses the child rows
+    """
+    headers = ['Category', 'Expense', 'Allotted', 'Spending', 'Comment']
+    fields = {2: "Allotted", 3: "Spending", 4: "Comment"}
+    # True/False on expense rows, None on category rows
+    OverBudgetRole = QtCore.Qt.UserRole + 1
 
-        self.setData(0, QtCore.Qt.UserRole, BudgetData(expense, allotted, spending, comment))
-        self.setText(1, expense)
-        self.setText(2, str(allotted))
-        self.setText(3, str(spending))
-        self.setText(4, comment)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.month_key: Tuple[str, str] = None
+        self._nodes: List[_CategoryNode] = []
+        self._nodes_by_name: Dict[str, _CategoryNode] = {}
+        # Rows edited or inserted since the last save, by
+        # (year, month, category, expense), kept across month switches
+        self._changes: Dict[Tuple[str, str, str, str], dict] = {}
+
+    def set_nodes(self, year: str, month: str, nodes: List[_CategoryNode]) -> None:
+        """
+        Shows prepared rows of the month, the model edits them in place
+        """
+        self.beginResetModel()
+        self.month_key = (year, month)
+        self._nodes = nodes
+        self._nodes_by_name = {}
+        for row, node in enumerate(self._nodes):
+            node.row = row
+            self._nodes_by_name[node.name] = node
+        self.endResetModel()
+
+    @property
+    def nodes(self) -> List[_CategoryNode]:
+        return self._nodes
+
+    # Qt model interface
+
+    def index(self, row: int, column: int, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, self._nodes[parent.row()])
+        return self.createIndex(row, column)
+
+    def parent(self, index: QtCore.QModelIndex) -> QtCore.QModelIndex:
+        node = index.internalPointer() if index.isValid() else None
+        if node is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row, 0)
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._nodes)
+        if parent.internalPointer() is None and parent.column() == 0:
+            return len(self._nodes[parent.row()].expenses)
+        return 0
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return len(self.headers)
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int = QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlags:
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        flags = QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled
+        if index.internalPointer() is not None and index.column() in self.fields:
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if node is None:
+            if role == QtCore.Qt.DisplayRole and index.column() == 0:
+                return self._nodes[index.row()].name
+            return None
 
-        if spending > allotted:
-            # print(f'spending {spending} > allotted {allotted}')
-            pass
+        expense = node.expenses[index.row()]
+        if role == self.OverBudgetRole:
+            return node.over[expense]
+        expense_data = node.data[expense]
+        if role not in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return None
+        column = index.column()
+        if column == 1:
+            return expense
+        if column in (2, 3):
+            return str(Money.parse(expense_data[self.fields[column]]))
+        if column == 4:
+            return expense_data["Comment"]
+        return None
+
+    def setData(self, index: QtCore.QModelIndex, value, role: int = QtCore.Qt.EditRole) -> bool:
+        if role != QtCore.Qt.EditRole or not index.isValid() or index.internalPointer() is None:
+            return False
+        field_name = self.fields.get(index.column())
+        if field_name is None:
+            return False
+        if field_name != "Comment":
+            try:
+                value = Money.parse(value)
+            except ValueError:
+                return False
+        node = index.internalPointer()
+        expense = node.expenses[index.row()]
+        node.data[expense][field_name] = value
+        self._mark_changed(node, expense)
+        over = over_budget(node.data[expense])
+        if over != node.over[expense]:
+            # Every cell of the row is framed with the over budget color
+            node.over[expense] = over
+            self.dataChanged.emit(index.siblingAtColumn(0), index.siblingAtColumn(len(self.headers) - 1),
+                                  [role, self.OverBudgetRole])
         else:
-            print(f'spending {spending} <= allotted {allotted}')
-            print(spending + 1, allotted + 1)
+            self.dataChanged.emit(index, index, [role])
+        return True
+
+    # Change tracking
+
+    def _mark_changed(self, node: _CategoryNode, expense: str) -> None:
+        if self.month_key is None:
+            return
+        self._changes[(*self.month_key, node.name, expense)] = node.data[expense]
+
+    def take_changes(self) -> Dict[Tuple[str, str, str, str], dict]:
+        """
+        Returns the rows changed since the last call and starts a new change set
+        """
+        changes, self._changes = self._changes, {}
+        return changes
+
+    # Lookups and structural changes used by the editor
+
+    def category_index(self, category: str) -> QtCore.QModelIndex:
+        node = self._nodes_by_name.get(category)
+        if node is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.row, 0)
+
+    def expense_index(self, category: str, expense: str, column: int = 1) -> QtCore.QModelIndex:
+        node = self._nodes_by_name.get(category)
+        if node is None or expense not in node.data:
+            return QtCore.QModelIndex()
+        return self.createIndex(node.expenses.index(expense), column, node)
+
+    def has_expense(self, category: str, expense: str) -> bool:
+        node = self._nodes_by_name.get(category)
+        return node is not None and expense in node.data
+
+    def keys(self, index: QtCore.QModelIndex) -> Tuple[str, Optional[str]]:
+        """
+        (category, expense) of the row, expense is None for category rows
+        """
+        node = index.internalPointer()
+        if node is None:
+            return self._nodes[index.row()].name, None
+        return node.name, node.expenses[index.row()]
+
+    def expenses(self):
+        for node in self._nodes:
+            for expense in node.expenses:
+                yield node.name, expense, node.data[expense]
+
+    def set_value(self, category: str, expense: str, field_name: str, value) -> None:
+        column = self.headers.index(field_name)
+        self.setData(self.expense_index(category, expense, column), value)
+
+    def insert_expense(self, category: str, expense: str, expense_data: dict) -> QtCore.QModelIndex:
+        node = self._nodes_by_name.get(category)
+        if node is None:
+            row = len(self._nodes)
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            node = _CategoryNode(category, {}, row)
+            self._nodes.append(node)
+            self._nodes_by_name[category] = node
+            self.endInsertRows()
+        row = len(node.expenses)
+        self.beginInsertRows(self.category_index(category), row, row)
+        node.expenses.append(expense)
+        node.data[expense] = expense_data
+        node.over[expense] = over_budget(expense_data)
+        self._mark_changed(node, expense)
+        self.endInsertRows()
+        count('expense rows')
+        return self.expense_index(category, expense)
+
+    def remove_category(self, category: str) -> None:
+        node = self._nodes_by_name.pop(category, None)
+        if node is None:
+            return
+        row = node.row
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self._nodes[row]
+        for following in self._nodes[row:]:
+            following.row -= 1
+        for expense in node.expenses:
+            self._changes.pop((*self.month_key, category, expense), None)
+        self.endRemoveRows()
+
+    def remove_expense(self, category: str, expense: str) -> None:
+        node = self._nodes_by_name.get(category)
+        if node is None or expense not in node.data:
+            return
+        row = node.expenses.index(expense)
+        self.beginRemoveRows(self.category_index(category), row, row)
+        del node.expenses[row]
+        del node.data[expense]
+        del node.over[expense]
+        self._changes.pop((*self.month_key, category, expense), None)
+        self.endRemoveRows()
 
 
 class BudgetItemDelegate(QtWidgets.QStyledItemDelegate):
@@ -701,109 +1091,81 @@ class BudgetItemDelegate(QtWidgets.QStyledItemDelegate):
 
     def __init__(self, parent):
         super().__init__(parent=parent)
+        # Created once, paint runs for every visible cell on each repaint
+        self.background = QtGui.QBrush(QtGui.QColor(0, 0, 0))
+        self.pens = {True: QtGui.QPen(QtGui.QColor("red")), False: QtGui.QPen(QtGui.QColor("green"))}
 
     def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> None:
-        option.backgroundBrush = QtGui.QBrush(QtGui.QColor(0, 0, 0))
+        option.backgroundBrush = self.background
         option.font.setBold(True)
         option.rect.adjust(2.2, 2.2, -2.2, -2.2)
-        item = self.parent().itemFromIndex(index)
-        data = item.data(0, QtCore.Qt.UserRole)
-        if data is not None:
-            if data.spending > data.allotted:
-                painter.setPen(QtGui.QPen("red"))
-                painter.drawRect(option.rect)
-            else:
-                painter.setPen(QtGui.QPen("green"))
-                painter.drawRect(option.rect)
+        over = index.data(BudgetMonthModel.OverBudgetRole)
+        if over is not None:
+            painter.setPen(self.pens[over])
+            painter.drawRect(option.rect)
 
         super().paint(painter, option, index)
 
 
-class BudgetTreeWidget(QtWidgets.QTreeWidget):
+class BudgetTreeView(QtWidgets.QTreeView):
     """
-    Class manages QTreeWidget and it's items of the YU
+    Class manages the tree view of the month shown by the UI
     """
 
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
+        self.setModel(BudgetMonthModel(self))
 
         self.setStyleSheet("""
-            QTreeWidget{
+            QTreeView{
                 border: 0;
                 background-color: #222222;
             }
-            QTreeWidget::item{
+            QTreeView::item{
                 border: 0;
                 background-color: #222222;
                 background-color: #222222;
                 padding: 10px;
                 border-radius: 10px;
             }
-            QTreeWidget::item:checked{
+            QTreeView::item:checked{
                 border: 2px solid;
                 border-color: #C29202;
                 background-color: #C29202;
             }
-            QTreeWidget::item:selected{
+            QTreeView::item:selected{
                 background-color: #0492C2;
             }
         """)
 
-    def find_category_item(self, category: str) -> QtWidgets.QTreeWidgetItem:
-        category_item = None
-        for i in range(self.topLevelItemCount()):
-            if self.topLevelItem(i).text(0) == category:
-                category_item = self.topLevelItem(i)
-                break
-        return category_item
-
-    def find_expense_item(self, category: str, expense: str) -> QtWidgets.QTreeWidgetItem:
-        category_item = self.find_category_item(category)
-        if not category_item:
-            return None
-        expense_item = None
-        for i in range(0, category_item.childCount()):
-            if category_item.child(i).text(1) == expense:
-                expense_item = category_item.child(i)
-        return expense_item
-
     def remove_currently_selected(self, year, month):
         """
         Removes currently selected
         """
-        current_item = self.currentItem()
-        if current_item:
-            parent_item = current_item.parent()
-            if parent_item:
-                index = parent_item.indexOfChild(current_item)
-                category = parent_item.text(0)
-                removed_item = parent_item.takeChild(index)
-                self.parent.del_row_signal.emit(year,
-                                                month,
-                                                category,
-                                                removed_item.text(1))
-                del removed_item
-            else:
-                # It's a top-level item
-                index = self.indexOfTopLevelItem(current_item)
-                removed_item = self.takeTopLevelItem(index)
-                self.parent.del_row_signal.emit(year,
-                                                month,
-                                                removed_item.text(0),
-                                                None)
-                del removed_item
+        current_index = self.currentIndex()
+        if not current_index.isValid():
+            return
+        model = self.model()
+        category, expense = model.keys(current_index)
+        if expense is not None:
+            model.remove_expense(category, expense)
+        else:
+            # It's a top-level item
+            model.remove_category(category)
+        self.parent.del_row_signal.emit(year,
+                                        month,
+                                        category,
+                                        expense)
 
     def update_expense_spending(self, data):
         """
         data passed to this method(slot) by the add_new_transaction_signal
         Signal of the parent BudgetEditorWindow: str
         """
-        print(data)
         for key, value in data.items():
             for key1, value1 in value.items():
-                tree_item = self.find_expense_item(key, key1)
-                tree_item.setText(3, str(value1))
+                self.model().set_value(key, key1, "Spending", value1)
 
 
 class StyleManager:
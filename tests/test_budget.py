@@ -0,0 +1,120 @@
+"""
+Budget level operations on both backends: rolling a month forward, the
+spending rollup from the transactions and the running totals.
+
+    python -m pytest tests
+"""
+import copy
+
+import pytest
+
+from budgetApp import Budget
+from budgetMoney import Money
+from budgetStorage import migrate_json_to_sqlite, write_json_atomic
+
+BUDGET = {
+    "2023": {
+        "January": {
+            "Food": {"Groceries": {"Allotted": "300", "Spending": "120.50", "Comment": "weekly"},
+                     "Dining": {"Allotted": "100", "Spending": "30", "Comment": ""}},
+            "Rent": {"Rent": {"Allotted": "1000", "Spending": "1000", "Comment": "flat"}},
+        },
+        "February": {
+            "Food": {"Groceries": {"Allotted": "320", "Spending": "10", "Comment": "kept"}},
+        },
+    },
+}
+
+
+@pytest.fixture(params=['.json', '.db'])
+def budget_path(request, tmp_path):
+    json_path = tmp_path / 'budget.json'
+    write_json_atomic(json_path, copy.deepcopy(BUDGET))
+    if request.param == '.json':
+        return str(json_path)
+    db_path = tmp_path / 'budget.db'
+    migrate_json_to_sqlite(str(json_path), str(db_path))
+    return str(db_path)
+
+
+def test_roll_forward_copies_allotted_and_comments(budget_path):
+    budget = Budget(budget_path)
+    version = budget.month_version("2023", "March")
+    copied = budget.roll_forward(("2023", "January"), [("2023", "January"), ("2023", "February"), ("2023", "March")])
+    # February keeps its groceries, March gets every expense
+    assert copied == 2 + 3
+    assert budget.month_version("2023", "March") > version
+    assert budget.data["2023"]["February"]["Food"]["Groceries"] == {
+        "Allotted": Money.parse("320"), "Spending": Money.parse("10"), "Comment": "kept"}
+    assert budget.data["2023"]["March"]["Food"]["Dining"] == {
+        "Allotted": Money.parse("100"), "Spending": Money(), "Comment": ""}
+
+    # The copies are not shared with the source month
+    budget.update_expense("2023", "March", "Rent", "Rent", "1100", "0", "new lease")
+    assert budget.data["2023"]["January"]["Rent"]["Rent"]["Allotted"] == Money.parse("1000")
+
+    budget.save()
+    reopened = Budget(budget_path)
+    assert reopened.data["2023"]["March"]["Rent"]["Rent"] == {
+        "Allotted": Money.parse("1100"), "Spending": Money(), "Comment": "new lease"}
+    assert reopened.data["2023"]["February"]["Food"]["Dining"]["Allotted"] == Money.parse("100")
+    assert reopened.data["2023"]["January"] == budget.data["2023"]["January"]
+
+
+def test_roll_forward_overwrite_and_keep_spending(budget_path):
+    budget = Budget(budget_path)
+    assert budget.roll_forward(("2023", "January"), [("2023", "February")], keep_spending=True, overwrite=True) == 3
+    assert budget.data["2023"]["February"]["Food"]["Groceries"] == {
+        "Allotted": Money.parse("300"), "Spending": Money.parse("120.50"), "Comment": "weekly"}
+    # Nothing left to copy
+    assert budget.roll_forward(("2023", "January"), [("2023", "February")]) == 0
+
+
+def test_rollup_sets_the_spending_of_every_expense_with_transactions(budget_path):
+    budget = Budget(budget_path)
+    rows = [(Money(cents), "Food", "Groceries" if cents % 2 else "Dining", "", f'{cents:032x}', "2023", "January")
+            for cents in range(1, 3001)]
+    rows.append((Money(500), "Fun", "Games", "", f'{0:032x}', "2023", "January"))
+    budget.budget_transactions.add_transactions(rows)
+
+    spending = budget.update_spending_from_transactions("2023", "January")
+    groceries = Money(sum(range(1, 3001, 2)))
+    dining = Money(sum(range(2, 3001, 2)))
+    # No expense for the games in January, their transactions change nothing
+    assert spending == {"Food": {"Groceries": groceries, "Dining": dining}, "Fun": {}}
+    assert budget.data["2023"]["January"]["Food"]["Groceries"]["Spending"] == groceries
+    assert budget.data["2023"]["January"]["Food"]["Dining"]["Spending"] == dining
+    # Expenses without transactions keep their spending
+    assert budget.data["2023"]["January"]["Rent"]["Rent"]["Spending"] == Money.parse("1000")
+
+    budget.save()
+    reopened = Budget(budget_path)
+    assert reopened.data["2023"]["January"]["Food"]["Dining"]["Spending"] == dining
+
+
+def test_running_totals_follow_each_transaction(budget_path):
+    budget = Budget(budget_path)
+    budget.add_new_transaction("Food", "Dining", "12.30", "cafe", "2023", "February")
+    budget.add_new_transaction("Food", "Groceries", "40", "shop", "2023", "February")
+    budget.add_new_transaction("Food", "Groceries", "9.95", "bakery", "2023", "February")
+    assert budget.spending_total("2023", "February", "Food", "Groceries") == Money.parse("49.95")
+    assert budget.spending_total("2023", "February", "Food", "Dining") == Money.parse("12.30")
+    # The spending of an expense follows its transactions, the others are left alone
+    assert budget.data["2023"]["February"]["Food"]["Groceries"]["Spending"] == Money.parse("49.95")
+    assert "Dining" not in budget.data["2023"]["February"]["Food"]
+
+    first = budget.transactions.for_expense("Food", "Groceries")[0]
+    budget.del_transaction({"amount": str(first.amount), "category": "Food", "expense": "Groceries",
+                            "comment": first.comment, "id": first.id, "year": "2023", "month": "February"})
+    # Deleting it again changes nothing
+    budget.del_transaction({"amount": str(first.amount), "category": "Food", "expense": "Groceries",
+                            "comment": first.comment, "id": first.id, "year": "2023", "month": "February"})
+    assert budget.spending_total("2023", "February", "Food", "Groceries") == Money.parse("9.95")
+    assert budget.data["2023"]["February"]["Food"]["Groceries"]["Spending"] == Money.parse("9.95")
+
+    # The totals are rebuilt from the stored transactions, not from the spending fields
+    budget.save()
+    reopened = Budget(budget_path)
+    assert reopened.spending_total("2023", "February", "Food", "Groceries") == Money.parse("9.95")
+    assert reopened.spending_total("2023", "February", "Food", "Dining") == Money.parse("12.30")
+    assert reopened.spending_total("2023", "January", "Food", "Groceries") == Money()
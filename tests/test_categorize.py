@@ -0,0 +1,79 @@
+"""
+Import rules and the learned categorizer: precedence of the rules and the
+keywords picked up from the comments of the transactions.
+"""
+import json
+import re
+
+import pytest
+
+from budgetApp import Transaction
+from budgetCategorize import Categorizer, trie_pattern
+from budgetImport import DEFAULT_EXPENSE, ImportRules
+
+
+def transaction(comment: str, category: str, expense: str) -> Transaction:
+    return Transaction(0, category, expense, comment, '')
+
+
+@pytest.mark.parametrize('rules', [
+    [("tesco", "Food", "Groceries"), ("shell", "Car", "Fuel")],
+    # A backreference rule is searched on its own, it must not jump the queue
+    [("tesco", "Food", "Groceries"), (r"(\d)\1", "Misc", "Doubles"), ("shell", "Car", "Fuel")],
+    # The same group name twice can't be combined, every rule is searched on its own
+    [("(?P<shop>tesco)", "Food", "Groceries"), ("(?P<shop>shell)", "Car", "Fuel")],
+])
+def test_the_first_listed_rule_wins(rules):
+    import_rules = ImportRules(rules)
+    assert import_rules.match("SHELL TESCO EXPRESS") == ("Food", "Groceries")
+    assert import_rules.match("shell station 42") == ("Car", "Fuel")
+    assert import_rules.match("bakery") is None
+
+
+def test_backreference_rule_keeps_its_place():
+    rules = ImportRules([("^aa$", "X", "Y"), (r"(a)\1", "Double", "A"), ("b", "Letter", "B")])
+    assert rules.match("aa") == ("X", "Y")
+    assert rules.match("baab") == ("Double", "A")
+    assert rules.match("abab") == ("Letter", "B")
+
+
+def test_rules_file(tmp_path):
+    path = tmp_path / 'rules.json'
+    assert ImportRules.from_file(path).match("tesco") is None
+    path.write_text(json.dumps([{"pattern": "^rent ", "category": "Rent", "expense": "Rent"}]))
+    assert ImportRules.from_file(path).match("Rent January") == ("Rent", "Rent")
+
+
+def test_trie_pattern_matches_the_same_words():
+    words = ['tesco', 'texaco', 'lidl', 'te', 'tesc']
+    pattern = re.compile(f'^{trie_pattern(words)}$')
+    assert all(pattern.match(word) for word in words)
+    assert not any(pattern.match(word) for word in ['t', 'tex', 'lid', 'tescos'])
+
+
+def test_learned_keywords_need_support_and_confidence():
+    categorizer = Categorizer().learn([
+        transaction("tesco metro", "Food", "Groceries"),
+        transaction("Tesco express", "Food", "Groceries"),
+        transaction("shell fuel", "Car", "Fuel"),
+        transaction("station shell", "Car", "Fuel"),
+        transaction("station coffee", "Food", "Dining"),
+        transaction("station parking", "Car", "Parking"),
+        transaction("unknown tesco", *DEFAULT_EXPENSE),
+    ])
+    assert categorizer.keywords() == {"tesco": ("Food", "Groceries"), "shell": ("Car", "Fuel")}
+    assert categorizer.match("TESCO STORES 1234") == ("Food", "Groceries")
+    # Parts of words are no keywords
+    assert categorizer.match("shellfish market") is None
+    assert categorizer.match("station") is None
+
+
+def test_rules_come_before_learned_keywords_and_forget_undoes_learning():
+    rules = ImportRules([("tesco petrol", "Car", "Fuel")])
+    first = transaction("tesco metro", "Food", "Groceries")
+    categorizer = Categorizer(rules).learn([first, transaction("tesco extra", "Food", "Groceries")])
+    assert categorizer.match("tesco petrol station") == ("Car", "Fuel")
+    assert categorizer.match("tesco") == ("Food", "Groceries")
+    categorizer.forget(first)
+    assert categorizer.match("tesco") is None
+    assert categorizer.categorize(["tesco petrol", "lidl"]) == [("Car", "Fuel"), None]
@@ -0,0 +1,100 @@
+"""
+Bank statement import: amount formats, CSV and OFX parsing and the
+statement-derived ids that make a second import of the same file a no-op.
+"""
+import pytest
+
+from budgetApp import Budget
+from budgetImport import CsvFormat, ImportRules, StatementImporter, _parse_amount, read_csv, read_ofx
+from budgetMoney import Money
+from budgetStorage import write_json_atomic
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20230105120000<TRNAMT>-12.50<FITID>abc1<NAME>TESCO STORES 1234<MEMO>groceries
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20230106<TRNAMT>1500.00<FITID>abc2<NAME>SALARY</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20230207<TRNAMT>-3,20<FITID>abc3<NAME>CAFE</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.mark.parametrize('value, decimal, thousands, expected', [
+    ("1,234.56", '.', ',', "1234.56"),
+    ("-1.234,56", ',', '.', "-1234.56"),
+    ("1234,5", ',', '.', "1234.50"),
+    ("+12", '.', ',', "12"),
+    ("1 234,56", ',', ' ', "1234.56"),
+    ("-0.5", '.', '', "-0.50"),
+])
+def test_parse_amount_with_the_statement_separators(value, decimal, thousands, expected):
+    assert _parse_amount(value, decimal, thousands) == Money.parse(expected)
+
+
+@pytest.mark.parametrize('value, decimal, thousands', [
+    ("1,5", '.', ','),
+    ("12,34.5", '.', ','),
+    ("1.234.5", ',', '.'),
+    ("1.999", '.', ','),
+    ("", '.', ','),
+    ("12 EUR", '.', ','),
+])
+def test_parse_amount_rejects_other_formats(value, decimal, thousands):
+    with pytest.raises(ValueError):
+        _parse_amount(value, decimal, thousands)
+
+
+def test_read_csv_european_format_skips_bad_rows(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text("Datum;Betrag;Text\n"
+                    "05.01.2023;-1.234,56;Miete  Januar\n"
+                    "06.01.2023;12,3.4;broken amount\n"
+                    "2023-13-01;-1,00;broken date\n"
+                    "07.02.2023;-4,5;Bäcker\n", encoding='utf-8')
+    csv_format = CsvFormat(date='Datum', amount='Betrag', description='Text', delimiter=';',
+                           decimal=',', thousands='.', date_formats=('%d.%m.%Y',))
+    entries = list(read_csv(path, csv_format))
+    assert [(entry.year, entry.month, entry.day, entry.amount, entry.description) for entry in entries] == [
+        ("2023", "January", 5, Money.parse("-1234.56"), "Miete Januar"),
+        ("2023", "February", 7, Money.parse("-4.50"), "Bäcker"),
+    ]
+
+
+def test_read_ofx_does_not_depend_on_the_chunk_size(tmp_path):
+    path = tmp_path / 'statement.ofx'
+    path.write_text(OFX)
+    entries = list(read_ofx(path))
+    assert [(entry.month, entry.day, entry.amount, entry.description, entry.reference) for entry in entries] == [
+        ("January", 5, Money.parse("-12.50"), "TESCO STORES 1234 groceries", "abc1"),
+        ("January", 6, Money.parse("1500"), "SALARY", "abc2"),
+        ("February", 7, Money.parse("-3.20"), "CAFE", "abc3"),
+    ]
+    # Chunks smaller than the header and than the tag values
+    for chunk_size in (1, 2, 3, 7, 16, 50):
+        assert list(read_ofx(path, chunk_size)) == entries
+
+
+def test_reimporting_a_statement_finds_every_transaction(tmp_path):
+    budget_path = tmp_path / 'budget.json'
+    empty = {"Allotted": "0", "Spending": "0", "Comment": ""}
+    write_json_atomic(budget_path, {"2023": {"January": {"Food": {"Groceries": dict(empty), "Dining": dict(empty)}}}})
+    statement = tmp_path / 'statement.csv'
+    statement.write_text("Date,Amount,Description\n"
+                         "2023-01-05,-2.50,Coffee\n"
+                         "2023-01-05,-2.50,Coffee\n"
+                         "2023-01-06,100.00,Refund\n"
+                         "2023-01-07,-40.00,Tesco\n")
+    rules = ImportRules([("tesco", "Food", "Groceries"), ("coffee", "Food", "Dining")])
+    budget = Budget(str(budget_path))
+
+    first = StatementImporter(budget, read_csv(statement), rules, batch_size=1).run()
+    # The two coffees of the same day are two transactions, the refund is no spending
+    assert (first.imported, first.duplicates, first.skipped) == (3, 0, 1)
+    again = StatementImporter(budget, read_csv(statement), rules).run()
+    assert (again.imported, again.duplicates, again.skipped) == (0, 3, 1)
+
+    assert len(budget.transactions) == 3
+    assert budget.data["2023"]["January"]["Food"]["Dining"]["Spending"] == Money.parse("5")
+    assert budget.data["2023"]["January"]["Food"]["Groceries"]["Spending"] == Money.parse("40")
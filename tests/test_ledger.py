@@ -0,0 +1,58 @@
+"""
+The column-wise transaction ledger: lookups by id, deletes and running totals.
+"""
+import random
+import uuid
+
+import budgetLedger
+from budgetLedger import ID_MASK, TransactionLedger
+from budgetMoney import Money
+
+
+def new_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def test_lookup_delete_and_readd_by_id(monkeypatch):
+    # Sort the id index again every few additions
+    monkeypatch.setattr(budgetLedger, 'MIN_RECENT_IDS', 8)
+    rng = random.Random(0)
+    ids = [new_id(rng) for _ in range(200)]
+    # Ids sharing their high half with another one
+    ids += [str(uuid.UUID(int=(uuid.UUID(ids[number]).int & ~ID_MASK) | rng.getrandbits(64)))
+            for number in range(30)]
+    ledger = TransactionLedger()
+    expected = {}
+    for _ in range(5000):
+        transaction_id = rng.choice(ids)
+        stored = ledger.get(transaction_id)
+        assert (stored is not None) == (transaction_id in expected)
+        if stored is not None:
+            assert stored.amount == Money(expected[transaction_id])
+        if rng.random() < 0.6:
+            cents = rng.randrange(1, 10000)
+            ledger.add_row(Money(cents), 'Food', 'Groceries', '', transaction_id, '2023', 'January')
+            expected[transaction_id] = cents
+        elif stored is not None:
+            ledger.discard(stored)
+            del expected[transaction_id]
+
+    assert len(ledger) == len(expected)
+    assert {row.id for row in ledger} == set(expected)
+    assert ledger.total('2023', 'January', 'Food', 'Groceries') == Money(sum(expected.values()))
+
+
+def test_rows_are_kept_in_insertion_order_per_month_and_expense():
+    rng = random.Random(1)
+    ledger = TransactionLedger()
+    first = ledger.add_row('1.50', 'Food', 'Groceries', 'tesco', new_id(rng), '2023', 'January')
+    second = ledger.add_row('2', 'Food', 'Dining', 'cafe', new_id(rng), '2023', 'January')
+    third = ledger.add_row('3', 'Food', 'Groceries', 'lidl', new_id(rng), '2023', 'February')
+    fourth = ledger.add_row('4', 'Food', 'Groceries', 'tesco', new_id(rng), '2023', 'January')
+    ledger.discard(first)
+
+    assert [row.id for row in ledger.for_expense('Food', 'Groceries')] == [third.id, fourth.id]
+    assert [row.id for row in ledger.for_month('2023', 'January')] == [second.id, fourth.id]
+    assert ledger.month_totals('2023', 'January') == {('Food', 'Groceries'): Money.parse('4'),
+                                                      ('Food', 'Dining'): Money.parse('2')}
+    assert first not in ledger and fourth in ledger
@@ -0,0 +1,49 @@
+"""
+Fixed-point amounts: parsing, rounding and integer arithmetic.
+"""
+import json
+
+import pytest
+
+from budgetMoney import Money, parse_month, to_json
+
+
+@pytest.mark.parametrize('value, cents', [
+    ("12.30", 1230),
+    ("0.005", 1),
+    ("-0.005", -1),
+    ("2.675", 268),
+    (7, 700),
+    (0.1, 10),
+    (1.005, 101),
+    (None, 0),
+])
+def test_parse_rounds_half_up_to_cents(value, cents):
+    assert Money.parse(value).cents == cents
+
+
+@pytest.mark.parametrize('value', ["", "abc", "1,5", "nan", "inf", object()])
+def test_parse_rejects_what_is_not_an_amount(value):
+    with pytest.raises(ValueError):
+        Money.parse(value)
+
+
+def test_float_sums_do_not_drift():
+    assert sum(Money.parse(0.1) for _ in range(10)) == Money.parse("1")
+    assert Money.parse("12.30") + Money.parse(0.7) == Money.parse("13")
+    assert Money.parse("5") - Money.parse("7.25") == -Money.parse("2.25")
+
+
+def test_comparisons_and_formatting():
+    assert Money.parse("100.01") > Money.parse("100")
+    assert not Money()
+    assert str(Money(-5)) == "-0.05"
+    assert repr(Money(123456)) == "Money('1234.56')"
+    assert f'{Money(1999):.1f}' == "20.0"
+
+
+def test_months_round_trip_through_json_strings():
+    month = parse_month({"Food": {"Groceries": {"Allotted": "300", "Spending": 120.5, "Comment": "x"}}})
+    assert month["Food"]["Groceries"]["Spending"] == Money(12050)
+    assert json.loads(json.dumps(month, default=to_json)) == {
+        "Food": {"Groceries": {"Allotted": "300.00", "Spending": "120.50", "Comment": "x"}}}
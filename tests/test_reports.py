@@ -0,0 +1,83 @@
+"""
+Trend reports over the rollup cube: monthly totals, year over year,
+rolling averages, overspend streaks and the incremental refresh.
+"""
+import copy
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from budgetApp import Budget  # noqa: E402
+from budgetStorage import write_json_atomic  # noqa: E402
+
+
+def expense(allotted: str, spending: str) -> dict:
+    return {"Allotted": allotted, "Spending": spending, "Comment": ""}
+
+
+BUDGET = {
+    "2022": {
+        "November": {"Food": {"Groceries": expense("100", "150")}},
+        "December": {"Food": {"Groceries": expense("100", "120")}, "Rent": {"Rent": expense("900", "900")}},
+    },
+    "2023": {
+        "January": {"Food": {"Groceries": expense("100", "130.50"), "Dining": expense("50", "20")}},
+        # February is missing
+        "March": {"Food": {"Groceries": expense("100", "160")}},
+        "November": {"Food": {"Groceries": expense("120", "90")}},
+    },
+}
+
+
+@pytest.fixture
+def budget(tmp_path):
+    path = tmp_path / 'budget.json'
+    write_json_atomic(path, copy.deepcopy(BUDGET))
+    return Budget(str(path))
+
+
+def test_monthly_totals_are_chronological(budget):
+    monthly = budget.reports.monthly()
+    assert list(monthly.index) == [("2022", "November"), ("2022", "December"), ("2023", "January"),
+                                   ("2023", "March"), ("2023", "November")]
+    assert monthly.loc[("2022", "December")].tolist() == [1000.0, 1020.0]
+    assert monthly.loc[("2023", "January"), "spending"] == 150.5
+    assert budget.reports.monthly("Food", "Dining")["allotted"].tolist() == [50.0]
+
+
+def test_year_over_year_change(budget):
+    table = budget.reports.year_over_year(category="Food")
+    assert table.loc["November"].tolist() == [150.0, 90.0]
+    change = budget.reports.year_over_year(category="Food", change=True)
+    assert change.loc["November", "2023"] == pytest.approx(-0.4)
+
+
+def test_rolling_average_skips_missing_months(budget):
+    table = budget.reports.rolling_average(window=2, category="Food")
+    assert table.loc[("2023", "January"), "Food"] == pytest.approx((120 + 150.5) / 2)
+    # February is not in the budget, March is averaged alone
+    assert table.loc[("2023", "March"), "Food"] == 160
+    assert ("2023", "February") in table.index
+    assert ("2023", "June") not in table.index
+
+
+def test_overspend_streaks(budget):
+    streaks = budget.reports.overspend_streaks()
+    assert streaks.to_dict('records') == [{"category": "Food", "expense": "Groceries", "start": "November 2022",
+                                           "end": "January 2023", "months": 3, "overspent": 100.5}]
+    assert budget.reports.overspend_streaks(min_months=1)["months"].tolist() == [3, 1]
+    assert budget.reports.overspend_streaks(category="Rent").empty
+
+
+def test_cube_refreshes_only_changed_months(budget, caplog):
+    reports = budget.reports
+    cube = reports.cube()
+    assert reports.cube() is cube
+    budget.update_expense("2023", "November", "Food", "Groceries", "120", "200", "")
+    budget.add_new_month("2023", "December")
+    budget.add_new_category("2023", "December", "Fun", "Games", "30", "")
+    assert reports.monthly().loc[("2023", "November"), "spending"] == 200
+    assert "2 month(s) of 6 rebuilt" in caplog.text
+    assert reports.monthly("Fun").loc[("2023", "December"), "allotted"] == 30
+    assert reports.cube() is not cube
@@ -0,0 +1,299 @@
+"""
+Crash safety and round trips of the budget storage: the JSON journal,
+the lazy month index, the transaction ledger and the SQLite backend.
+
+    python -m pytest tests
+"""
+import copy
+import gzip
+import json
+import sqlite3
+import time
+import uuid
+
+import pytest
+
+from budgetApp import Budget, Transaction
+from budgetLedger import FLUSH_INTERVAL, LedgerLog
+from budgetMoney import Money, parse_month
+from budgetStorage import (INDEX_SUFFIX, BudgetJournal, JsonBudgetStorage, LazyYear, SqliteBudgetStorage, build_index,
+                           index_months, load_lazy, migrate_json_to_sqlite, read_json, write_json_atomic)
+
+BUDGET = {
+    "2023": {
+        "January": {
+            "Food": {"Groceries": {"Allotted": "300", "Spending": "120.5", "Comment": ""},
+                     "Dining": {"Allotted": "100", "Spending": "0", "Comment": "out"}},
+            "Rent": {"Rent": {"Allotted": "1000", "Spending": "1000", "Comment": ""}},
+        },
+        "February": {
+            "Food": {"Groceries": {"Allotted": "320", "Spending": "0", "Comment": ""}},
+        },
+    },
+    "2024": {
+        "January": {
+            "Rent": {"Rent": {"Allotted": "1050", "Spending": "0", "Comment": "new lease"}},
+        },
+    },
+}
+
+
+@pytest.fixture(params=['budget.json', 'budget.json.gz'])
+def budget_file(request, tmp_path):
+    path = tmp_path / request.param
+    write_json_atomic(path, BUDGET)
+    return path
+
+
+def plain(data: dict) -> dict:
+    """
+    The budget as JSON values, with every lazy month loaded
+    """
+    return json.loads(json.dumps({year: dict(year_data.items()) for year, year_data in data.items()},
+                                 default=str))
+
+
+def expense(data: dict, year: str, month: str, category: str, name: str) -> dict:
+    return data[year][month][category][name]
+
+
+def test_index_months_slices_every_month():
+    raw = json.dumps(BUDGET, indent=2).encode()
+    index = index_months(raw)
+    assert {year: list(months) for year, months in index.items()} == {"2023": ["January", "February"],
+                                                                      "2024": ["January"]}
+    for year, months in index.items():
+        for month, (start, end) in months.items():
+            assert json.loads(raw[start:end]) == BUDGET[year][month]
+
+
+def test_index_months_ignores_brackets_in_strings():
+    budget = {"2023": {"January": {"Food {old}": {"Groceries": {"Allotted": "1", "Spending": "0",
+                                                                "Comment": "\"[}"}}}}}
+    raw = json.dumps(budget).encode()
+    start, end = index_months(raw)["2023"]["January"]
+    assert json.loads(raw[start:end]) == budget["2023"]["January"]
+
+
+def test_lazy_load_only_reads_accessed_months(budget_file):
+    data = load_lazy(budget_file)
+    assert isinstance(data["2023"], LazyYear)
+    assert data["2023"].loaded_months() == []
+    assert expense(data, "2023", "February", "Food", "Groceries")["Allotted"] == Money.parse("320")
+    assert data["2023"].loaded_months() == ["February"]
+
+
+def test_compressed_months_are_read_from_their_own_member(tmp_path):
+    path = tmp_path / "budget.json.gz"
+    index = write_json_atomic(path, BUDGET)
+    assert read_json(path) == BUDGET
+    member_start, member_end, start, end = index["2023"]["February"]
+    with open(path, "rb") as jsonfile:
+        jsonfile.seek(member_start)
+        member = gzip.decompress(jsonfile.read(member_end - member_start))
+    assert parse_month(json.loads(member[start:end])) == parse_month(copy.deepcopy(BUDGET["2023"]["February"]))
+    # Indexing the file again finds the same members
+    path.with_name(path.name + INDEX_SUFFIX).unlink()
+    assert build_index(path) == index
+
+
+def test_single_member_gzip_is_read_without_member_offsets(tmp_path):
+    path = tmp_path / "budget.json.gz"
+    path.write_bytes(gzip.compress(json.dumps(BUDGET).encode()))
+    data = load_lazy(path)
+    assert all(len(offsets) == 2 for months in build_index(path).values() for offsets in months.values())
+    assert expense(data, "2024", "January", "Rent", "Rent")["Comment"] == "new lease"
+    for year, months in BUDGET.items():
+        for month, month_data in months.items():
+            assert data[year][month] == parse_month(copy.deepcopy(month_data))
+
+
+def test_replay_skips_torn_last_record(budget_file):
+    journal = BudgetJournal(budget_file)
+    journal.record('set', ("2023", "January", "Food", "Groceries"),
+                   {"Allotted": Money.parse("350"), "Spending": Money.parse("120.5"), "Comment": "more"})
+    journal.record('del', ("2023", "January", "Rent"))
+    journal.flush()
+    # A crash in the middle of the next append
+    with open(journal.log_path, 'a') as log:
+        log.write('{"op":"set","path":["2023","February","Food","Gro')
+
+    data = BudgetJournal(budget_file).replay(read_json(budget_file))
+    assert expense(data, "2023", "January", "Food", "Groceries") == {
+        "Allotted": Money.parse("350"), "Spending": Money.parse("120.5"), "Comment": "more"}
+    assert "Rent" not in data["2023"]["January"]
+    # Untouched months keep the amounts as read from the file
+    assert expense(data, "2023", "February", "Food", "Groceries")["Allotted"] == "320"
+
+
+def test_replay_is_idempotent(budget_file):
+    journal = BudgetJournal(budget_file)
+    journal.record('new', ("2024", "February"))
+    journal.record('merge', ("2024", "February"),
+                   {"Food": {"Groceries": {"Allotted": Money.parse("10"), "Spending": Money(), "Comment": ""}}})
+    journal.record('del', ("2023", "February", "Food", "Groceries"))
+    journal.flush()
+
+    once = journal.replay(read_json(budget_file))
+    twice = journal.replay(journal.replay(read_json(budget_file)))
+    assert plain(once) == plain(twice)
+
+
+def test_compaction_keeps_months_not_loaded(budget_file):
+    storage = JsonBudgetStorage(str(budget_file))
+    data = storage.load()
+    january = data["2023"]["January"]
+    january["Food"]["Groceries"]["Allotted"] = Money.parse("400")
+    storage.set_expense("2023", "January", "Food", "Groceries", january["Food"]["Groceries"])
+    storage.save()
+    # The file is rewritten under the lazy months that were never read
+    storage.journal.compact(wait=True)
+
+    assert not storage.journal.log_path.exists()
+    assert storage.journal.rotated_logs() == []
+    assert data["2023"].loaded_months() == ["January"]
+    assert data["2023"]["February"] == parse_month(copy.deepcopy(BUDGET["2023"]["February"]))
+    assert data["2024"]["January"] == parse_month(copy.deepcopy(BUDGET["2024"]["January"]))
+
+    reopened = JsonBudgetStorage(str(budget_file)).load()
+    assert expense(reopened, "2023", "January", "Food", "Groceries")["Allotted"] == Money.parse("400")
+
+
+def test_compaction_interrupted_before_dropping_the_logs_replays_them(budget_file):
+    storage = JsonBudgetStorage(str(budget_file))
+    storage.load()
+    storage.set_expense("2024", "January", "Rent", "Rent",
+                        {"Allotted": Money.parse("1100"), "Spending": Money(), "Comment": ""})
+    storage.save()
+    rotated = storage.journal.log_path.with_name(storage.journal.log_path.name + '.1')
+    storage.journal.log_path.rename(rotated)
+    # The main file was written but the crash left the rotated log behind
+    data = storage.journal.replay(read_json(budget_file))
+    write_json_atomic(budget_file, data)
+
+    reopened = JsonBudgetStorage(str(budget_file)).load()
+    assert expense(reopened, "2024", "January", "Rent", "Rent")["Allotted"] == Money.parse("1100")
+
+
+def transaction(amount: str, expense_name: str = "Groceries", month: str = "January") -> Transaction:
+    return Transaction(amount, "Food", expense_name, "shop", str(uuid.uuid4()), "2023", month)
+
+
+def test_ledger_replays_adds_and_deletes(tmp_path):
+    log = LedgerLog(tmp_path / 'budget.json', batch_size=2)
+    first, second, third = transaction("10"), transaction("2.50"), transaction("7", "Dining")
+    log.append(first)
+    log.append(second)
+    log.remove(first)
+    log.append(third)
+    log.flush()
+    with open(log.log_path, 'a') as ledger:
+        ledger.write('{"op":"add","row":["1"')
+
+    rows = LedgerLog(tmp_path / 'budget.json').load()
+    assert [row[4] for row in rows] == [second.id, third.id]
+
+
+@pytest.mark.parametrize('backend', ['.json', '.db'])
+def test_budget_round_trip(backend, tmp_path):
+    json_path = tmp_path / 'budget.json'
+    write_json_atomic(json_path, BUDGET)
+    budget_path = json_path
+    if backend == '.db':
+        budget_path = tmp_path / 'budget.db'
+        migrate_json_to_sqlite(str(json_path), str(budget_path))
+
+    budget = Budget(str(budget_path))
+    budget.update_expense("2023", "February", "Food", "Groceries", "330.10", "0", "edited")
+    budget.add_new_category("2024", "January", "Food", "Groceries", "250", "")
+    budget.add_new_transaction("Food", "Groceries", "40.10", "shop", "2024", "January")
+    budget.add_new_transaction("Food", "Groceries", "9.95", "bakery", "2024", "January")
+    budget.save()
+
+    reopened = Budget(str(budget_path))
+    assert plain(reopened.data) == plain(budget.data)
+    assert expense(reopened.data, "2023", "February", "Food", "Groceries") == {
+        "Allotted": Money.parse("330.10"), "Spending": Money(), "Comment": "edited"}
+    # The spending was committed with the transactions, not recomputed on load
+    assert expense(reopened.data, "2024", "January", "Food", "Groceries")["Spending"] == Money.parse("50.05")
+    assert len(reopened.transactions.for_expense("Food", "Groceries")) == 2
+    assert reopened.totals("2024") == {"Rent": (Money.parse("1050"), Money()),
+                                       "Food": (Money.parse("250"), Money.parse("50.05"))}
+
+
+@pytest.mark.parametrize('backend', ['.json', '.db'])
+def test_spending_is_committed_with_the_transactions(backend, tmp_path):
+    json_path = tmp_path / 'budget.json'
+    write_json_atomic(json_path, BUDGET)
+    budget_path = json_path
+    if backend == '.db':
+        budget_path = tmp_path / 'budget.db'
+        migrate_json_to_sqlite(str(json_path), str(budget_path))
+
+    budget = Budget(str(budget_path))
+    budget.add_new_category("2023", "February", "Fun", "Games", "20", "")
+    budget.add_new_transaction("Food", "Groceries", "40.10", "shop", "2023", "February")
+    first = budget.transactions.for_expense("Food", "Groceries")[0]
+    budget.add_new_transaction("Food", "Groceries", "9.90", "bakery", "2023", "February")
+    budget.del_transaction({"amount": first.amount, "category": "Food", "expense": "Groceries", "comment": "shop",
+                            "id": first.id, "year": "2023", "month": "February"})
+    # No save, only the group commit of the transactions
+    time.sleep(FLUSH_INTERVAL * 3)
+
+    reopened = Budget(str(budget_path))
+    assert expense(reopened.data, "2023", "February", "Food", "Groceries")["Spending"] == Money.parse("9.90")
+    assert [transaction.amount for transaction in reopened.transactions.for_expense("Food", "Groceries")] == [
+        Money.parse("9.90")]
+    if backend == '.json':
+        # The other changes still wait for the save
+        assert "Fun" not in reopened.data["2023"]["February"]
+
+
+def test_migration_copies_the_transactions(tmp_path):
+    json_path = tmp_path / 'budget.json'
+    write_json_atomic(json_path, BUDGET)
+    budget = Budget(str(json_path))
+    budget.add_new_transaction("Food", "Groceries", "12.34", "shop", "2023", "January")
+    budget.save()
+
+    migrate_json_to_sqlite(str(json_path), str(tmp_path / 'budget.db'))
+    rows = SqliteBudgetStorage(str(tmp_path / 'budget.db')).load_transactions()
+    assert [(row[0], row[1], row[2]) for row in rows] == [(Money.parse("12.34"), "Food", "Groceries")]
+
+
+def test_sqlite_transactions_are_committed_without_save(tmp_path):
+    storage = SqliteBudgetStorage(str(tmp_path / 'budget.db'), batch_size=2)
+    storage.add_transaction(transaction("1.10"))
+    storage.add_transaction(transaction("2.20"))
+    # Another connection only sees committed rows
+    other = sqlite3.connect(str(tmp_path / 'budget.db'))
+    assert other.execute('SELECT SUM(amount) FROM transactions').fetchone() == (330,)
+
+
+def test_sqlite_real_amounts_are_converted_to_cents(tmp_path):
+    db_path = tmp_path / 'budget.db'
+    connection = sqlite3.connect(str(db_path))
+    connection.executescript("""
+        CREATE TABLE months (year TEXT NOT NULL, month TEXT NOT NULL, PRIMARY KEY (year, month));
+        CREATE TABLE categories (year TEXT NOT NULL, month TEXT NOT NULL, category TEXT NOT NULL,
+                                 PRIMARY KEY (year, month, category));
+        CREATE TABLE expenses (year TEXT NOT NULL, month TEXT NOT NULL, category TEXT NOT NULL,
+                               expense TEXT NOT NULL, allotted REAL NOT NULL DEFAULT 0,
+                               spending REAL NOT NULL DEFAULT 0, comment TEXT NOT NULL DEFAULT '',
+                               PRIMARY KEY (year, month, category, expense));
+        CREATE TABLE transactions (id TEXT PRIMARY KEY, year TEXT NOT NULL, month TEXT NOT NULL,
+                                   category TEXT NOT NULL, expense TEXT NOT NULL, amount REAL NOT NULL,
+                                   comment TEXT NOT NULL DEFAULT '');
+        INSERT INTO months VALUES ('2023', 'January');
+        INSERT INTO categories VALUES ('2023', 'January', 'Food');
+        INSERT INTO expenses VALUES ('2023', 'January', 'Food', 'Groceries', 300.1, 0.29, '');
+        INSERT INTO transactions VALUES ('a', '2023', 'January', 'Food', 'Groceries', 0.29, '');
+    """)
+    connection.commit()
+    connection.close()
+
+    storage = SqliteBudgetStorage(str(db_path))
+    assert storage.load_month("2023", "January") == {
+        "Food": {"Groceries": {"Allotted": Money.parse("300.10"), "Spending": Money.parse("0.29"), "Comment": ""}}}
+    assert storage.load_transactions()[0][0] == Money.parse("0.29")
+    assert storage._execute('SELECT typeof(allotted) FROM expenses') == [('integer',)]